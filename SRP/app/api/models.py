@@ -1,14 +1,118 @@
 # app/api/models.py
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional
+from ..core.config import MAX_BATCH_QUERIES, MAX_PAGE_SIZE
 
 class SearchQuery(BaseModel):
     query: str
+    # Optional time budget for this request. Falls back to SEARCH_DEADLINE_MS when omitted.
+    deadline_ms: Optional[int] = Field(default=None, gt=0)
+    # Optional projection, e.g. ["product_name", "brand", "discounted_price", "image"].
+    # When set, `results` carries these fields for each ranked product.
+    fields: Optional[List[str]] = None
+    # Pagination. Without `limit` or `cursor` the whole ranking is returned, as before,
+    # and a non-zero `offset` is rejected.
+    limit: Optional[int] = Field(default=None, gt=0, le=MAX_PAGE_SIZE)
+    offset: int = Field(default=0, ge=0)
+    # Opaque token from a previous response's `next_cursor`; takes precedence over `offset`
+    cursor: Optional[str] = None
+    include_scores: bool = False
 
 class Product(BaseModel):
     id: str
     document: str
     metadata: Dict[str, Any]
+    # Display fields (product_name, brand, prices, image, ...) for the product store
+    attributes: Optional[Dict[str, Any]] = None
 
 class SearchResponse(BaseModel):
-    ranked_ids: List[str]
\ No newline at end of file
+    ranked_ids: List[str]
+    # True when the reranker was skipped to meet the deadline (bi-encoder order returned)
+    degraded: bool = False
+    # Sharded deployments only: True when some shards didn't answer in time, so results may be missing
+    partial: bool = False
+    # Hydrated products, in ranked order. Only present when `fields` was requested.
+    results: Optional[List[Dict[str, Any]]] = None
+    # Reranker scores aligned with `ranked_ids`. Only present when `include_scores` was set.
+    scores: Optional[List[float]] = None
+    # Paginated requests only: size of the full ranking and the cursor for the next page
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
+
+class BatchSearchQuery(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=MAX_BATCH_QUERIES)
+    # Optional time budget for the whole batch. Batches have no deadline by default.
+    deadline_ms: Optional[int] = Field(default=None, gt=0)
+    # Optional projection applied to every query's results (see SearchQuery.fields)
+    fields: Optional[List[str]] = None
+
+class BatchSearchResponse(BaseModel):
+    # One entry per query, in request order
+    results: List[SearchResponse]
+
+class SearchStats(BaseModel):
+    requests: int
+    degraded: int
+    shed: int
+    inference_queue_depth: int
+    inference_max_queue_depth: int
+    # Worker pool only (INFERENCE_WORKERS > 0): workers currently serving, and crashed workers replaced so far
+    inference_workers_alive: Optional[int] = None
+    inference_worker_restarts: Optional[int] = None
+    rerank_ms_per_pair: Optional[float] = None
+    cache: Dict[str, int]
+    ranking_sessions: Dict[str, int]
+    # Coordinator only: shard requests, failed shard requests and searches served with partial results
+    shards: Optional[Dict[str, int]] = None
+
+class CacheWarmStatus(BaseModel):
+    popular_queries: int
+    cached: int
+    coverage: float
+    index_version: int
+    warmed_version: Optional[int] = None
+    stale: bool
+    running: bool
+    last_started_at: Optional[float] = None
+    seconds_since_last_warm: Optional[float] = None
+    last_run_queries: int
+    last_run_seconds: Optional[float] = None
+
+class ProfilingConfig(BaseModel):
+    # Fraction of API requests to trace and sample, 0 to switch off
+    sample_rate: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    # Stack sampling interval
+    interval_ms: Optional[float] = Field(default=None, ge=1.0, le=1000.0)
+
+class ProfilingStatus(BaseModel):
+    sample_rate: float
+    interval_ms: float
+    sampler_running: bool
+    profiled_requests: int
+    stored_traces: int
+    samples: int
+    distinct_stacks: int
+
+class ShardRetrieveRequest(BaseModel):
+    # Query embedding computed by the coordinator
+    embedding: List[float]
+    # Categories to retrieve from; None for an unfiltered search
+    categories: Optional[List[str]] = None
+    n_results: int = Field(gt=0)
+
+class ShardResultSet(BaseModel):
+    category: Optional[str] = None
+    ids: List[str]
+    documents: List[str]
+    distances: List[float]
+
+class ShardRetrieveResponse(BaseModel):
+    results: List[ShardResultSet]
+
+class ShardProductsRequest(BaseModel):
+    ids: List[str]
+    fields: List[str]
+
+class ShardProductsResponse(BaseModel):
+    # One entry per requested ID, None where this shard doesn't have the product
+    results: List[Optional[Dict[str, Any]]]
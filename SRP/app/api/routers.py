@@ -1,8 +1,23 @@
 # app/api/routers.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from .models import SearchQuery, Product, SearchResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from typing import List, Optional
+import secrets
+from .models import (
+    SearchQuery, Product, SearchResponse, SearchStats, BatchSearchQuery, BatchSearchResponse, CacheWarmStatus,
+    ProfilingConfig, ProfilingStatus, ShardRetrieveRequest, ShardRetrieveResponse, ShardProductsRequest,
+    ShardProductsResponse
+)
 from ..services.search_service import SearchService
+from ..services.inference_executor import ExecutorSaturatedError
+from ..services.cache_warmer import CacheWarmer
+from ..services.ranking_sessions import CursorMismatchError, encode_cursor, decode_cursor
+from ..services.sharding import ShardsUnavailableError
+from ..core.config import (
+    RETRY_AFTER_SECONDS, ADMIN_API_TOKEN, PROFILING_SAMPLE_RATE, PROFILING_SAMPLE_INTERVAL_MS,
+    PROFILING_MAX_TRACES, PROFILING_MAX_STACKS
+)
+from ..core.profiling import RequestProfiler, span, format_collapsed
 from ..db.chroma_manager import ChromaManager
 import logging
 
@@ -17,6 +32,10 @@ try:
     logger.info("Initializing application components...")
     chroma_manager = ChromaManager()
     search_service = SearchService(chroma_manager)
+    cache_warmer = CacheWarmer(search_service)
+    request_profiler = RequestProfiler(
+        PROFILING_SAMPLE_RATE, PROFILING_SAMPLE_INTERVAL_MS, PROFILING_MAX_TRACES, PROFILING_MAX_STACKS
+    )
     logger.info("Application components initialized successfully.")
 except Exception as e:
     logger.error(f"Failed to initialize application components: {e}")
@@ -27,15 +46,184 @@ except Exception as e:
 def get_search_service():
     """Dependency function to get the search service instance."""
     return search_service
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """Guards the admin endpoints. Without ADMIN_API_TOKEN configured they are disabled."""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin endpoints are disabled. Set SRP_ADMIN_TOKEN to enable them."
+        )
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode(), ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required.")
 # --------------------------------------------------------------------------
 
+def validate_fields(fields, service: SearchService):
+    """Rejects projections that name fields the product store doesn't have."""
+    if fields:
+        unknown = [f for f in fields if f not in service.product_store.fields]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields {unknown}. Available fields: {service.product_store.fields}"
+            )
+
+async def build_search_response(result, fields, service: SearchService, include_scores: bool = False):
+    response = SearchResponse(ranked_ids=result["ranked_ids"], degraded=result["degraded"], partial=result["partial"])
+    if fields:
+        with span("hydrate", products=len(result["ranked_ids"]), fields=len(fields)):
+            response.results = await service.hydrate(result["ranked_ids"], fields)
+    if include_scores:
+        response.scores = result["scores"]
+    if "session_id" in result:
+        # Paginated result: point the client at the next slice of the same stored ranking
+        response.total = result["total"]
+        if result["next_offset"] is not None:
+            response.next_cursor = encode_cursor(result["session_id"], result["next_offset"], len(result["ranked_ids"]))
+    return response
+
 @router.post("/search", response_model=SearchResponse)
 async def search_products(request: SearchQuery, service: SearchService = Depends(get_search_service)):
     logger.info(f"Received search query: '{request.query}'")
-    # `await` the asynchronous service call
-    ranked_ids = await service.search(request.query)
-    logger.info(f"Returning {len(ranked_ids)} ranked results.")
-    return SearchResponse(ranked_ids=ranked_ids)
+    validate_fields(request.fields, service)
+    if request.offset and request.limit is None and not request.cursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="`offset` needs a `limit`; without one the whole ranking is returned."
+        )
+    session_id, offset, limit = None, request.offset, request.limit
+    if request.cursor:
+        try:
+            session_id, offset, cursor_limit = decode_cursor(request.cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        limit = request.limit or cursor_limit
+    try:
+        if limit is not None:
+            # Paginated: the full ranking is computed once and later pages are slices of it
+            result = await service.search_page(
+                request.query, offset, limit, session_id=session_id, deadline_ms=request.deadline_ms
+            )
+        else:
+            # `await` the asynchronous service call
+            result = await service.search(request.query, deadline_ms=request.deadline_ms)
+    except CursorMismatchError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except ExecutorSaturatedError as e:
+        logger.warning(f"Shedding search query '{request.query}': {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search service is overloaded. Please retry shortly.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+    except ShardsUnavailableError as e:
+        logger.error(f"Search query '{request.query}' failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search shards are unavailable. Please retry shortly.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+    logger.info(f"Returning {len(result['ranked_ids'])} ranked results "
+                f"(degraded={result['degraded']}, partial={result['partial']}).")
+    return await build_search_response(result, request.fields, service, include_scores=request.include_scores)
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def search_products_batch(request: BatchSearchQuery, service: SearchService = Depends(get_search_service)):
+    """
+    Runs many queries in one call. Embedding, intent classification and reranking
+    are batched across queries; results come back in request order.
+    """
+    logger.info(f"Received batch of {len(request.queries)} search queries.")
+    validate_fields(request.fields, service)
+    try:
+        results = await service.search_batch(request.queries, deadline_ms=request.deadline_ms)
+    except ExecutorSaturatedError as e:
+        logger.warning(f"Shedding batch of {len(request.queries)} queries: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search service is overloaded. Please retry shortly.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+    except ShardsUnavailableError as e:
+        logger.error(f"Batch of {len(request.queries)} queries failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search shards are unavailable. Please retry shortly.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+    return BatchSearchResponse(results=[await build_search_response(r, request.fields, service) for r in results])
+
+@router.get("/search/stats", response_model=SearchStats)
+def search_stats(service: SearchService = Depends(get_search_service)):
+    """Reports how many searches were degraded to bi-encoder order or shed under load."""
+    return SearchStats(**service.get_stats())
+
+@router.get("/cache/warm/status", response_model=CacheWarmStatus)
+def cache_warm_status():
+    """Reports how much of the popular-query list is cached and how fresh it is."""
+    return CacheWarmStatus(**cache_warmer.report())
+
+# --- Shard endpoints (called by the coordinator in a sharded deployment) ---
+@router.post("/shard/retrieve", response_model=ShardRetrieveResponse)
+async def shard_retrieve(request: ShardRetrieveRequest, service: SearchService = Depends(get_search_service)):
+    """This shard's nearest products to a coordinator-computed query embedding, per category."""
+    results = await service.retrieve_local(request.embedding, request.categories, request.n_results)
+    return ShardRetrieveResponse(results=results)
+
+@router.post("/shard/products", response_model=ShardProductsResponse)
+def shard_products(request: ShardProductsRequest, service: SearchService = Depends(get_search_service)):
+    """Display fields for the products this shard holds, for hydration on the coordinator."""
+    validate_fields(request.fields, service)
+    return ShardProductsResponse(results=service.product_store.get_many(request.ids, request.fields))
+
+# --- Admin: profiling ---
+@router.get("/admin/profiling", response_model=ProfilingStatus, dependencies=[Depends(require_admin)])
+def profiling_status():
+    return ProfilingStatus(**request_profiler.status())
+
+@router.put("/admin/profiling", response_model=ProfilingStatus, dependencies=[Depends(require_admin)])
+def configure_profiling(config: ProfilingConfig):
+    """Changes the profiled share of traffic or the sampling interval without a restart."""
+    request_profiler.configure(sample_rate=config.sample_rate, interval_ms=config.interval_ms)
+    return ProfilingStatus(**request_profiler.status())
+
+@router.delete("/admin/profiling", response_model=ProfilingStatus, dependencies=[Depends(require_admin)])
+def reset_profiling():
+    """Discards the accumulated profile and stored traces, e.g. before a load test."""
+    request_profiler.reset()
+    return ProfilingStatus(**request_profiler.status())
+
+@router.get("/admin/profiling/traces", dependencies=[Depends(require_admin)])
+def list_traces(limit: int = 50):
+    """Summaries of the most recent profiled requests, newest first."""
+    traces = list(request_profiler.traces)[::-1][:limit]
+    return [t.summary() for t in traces]
+
+@router.get("/admin/profiling/traces/{trace_id}", dependencies=[Depends(require_admin)])
+def get_trace(trace_id: str):
+    """The full span trace of one profiled request."""
+    trace = request_profiler.get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trace not found (it may have been evicted).")
+    return trace.to_dict()
+
+@router.get("/admin/profiling/profile.collapsed", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+def download_profile(trace_id: Optional[str] = None):
+    """
+    Sampled stacks in collapsed format, ready for flamegraph.pl or speedscope.
+    Covers all profiled requests, or only the window of one request with `trace_id`.
+    """
+    if trace_id is None:
+        samples = request_profiler.sampler.profile
+    else:
+        trace = request_profiler.get_trace(trace_id)
+        if trace is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trace not found (it may have been evicted).")
+        samples = trace.samples
+    return PlainTextResponse(
+        format_collapsed(samples),
+        headers={"Content-Disposition": f'attachment; filename="{trace_id or "srp"}.collapsed"'}
+    )
 
 @router.post("/products", status_code=status.HTTP_201_CREATED)
 def add_products(products: List[Product], service: SearchService = Depends(get_search_service)):
@@ -22,15 +22,50 @@ CATEGORY_DATA_PATH = ROOT_DIR / "data" / CATEGORY_DATA_FILE
 
 # --- ChromaDB Collection Names ---
 
-# ChromaDB settings
-DB_PATH = str(ROOT_DIR / "db_storage")
+# ChromaDB settings. Overridable so several shard processes on one machine each get their own storage.
+DB_PATH = os.environ.get("SRP_DB_PATH", str(ROOT_DIR / "db_storage"))
 PRODUCT_COLLECTION_NAME="products_v1"
 CATEGORY_COLLECTION_NAME="categories_v1"
 
+# --- Product Vector Storage ---
+# "chroma" keeps product vectors as float32 in ChromaDB's HNSW index.
+# "float16" or "int8" keeps them in a memory-mapped compact store instead (2x / 4x smaller),
+# searched on the compact vectors and rescored exactly against float32 copies on disk.
+# Switching modes requires re-running the bulk indexer.
+PRODUCT_VECTOR_STORAGE = "chroma"
+COMPACT_VECTOR_STORE_PATH = Path(DB_PATH) / "compact_products"
+# The compact scan shortlists n_results * this factor candidates for exact rescoring
+COMPACT_RESCORE_FACTOR = 4
+
+# --- Product Store (result hydration) ---
+# Memory-mapped columnar copy of product display fields, keyed by PID.
+# Built by the bulk indexer; searches can ask for any of these via `fields`.
+PRODUCT_STORE_PATH = Path(DB_PATH) / "product_store"
+PRODUCT_STORE_FIELDS = [
+    "product_name", "brand", "retail_price", "discounted_price", "image",
+    "product_rating", "product_url", "category", "subcategory", "description"
+]
+# Fields hydrated as numbers ("int" or "float"); the rest come back as strings.
+# Applies to stores built after a change; re-run the bulk indexer to retype an existing one.
+PRODUCT_STORE_FIELD_TYPES = {"retail_price": "float", "discounted_price": "float"}
+
 # Model settings
 EMBEDDING_MODEL = 'all-MiniLM-L6-v2' # Use a smaller one for faster local iteration
 RERANKER_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
 
+# Where the models come from: "sentence_transformers" loads the models above from the
+# Hugging Face hub; "stub" uses deterministic hash-based fakes that need no download
+# and cost almost nothing, for offline CI and for benchmarking the non-model hot path.
+# Indexes built with one backend must be rebuilt before searching with the other.
+MODEL_BACKEND = os.environ.get("SRP_MODEL_BACKEND", "sentence_transformers")
+# Stub embedding size; matches all-MiniLM-L6-v2
+STUB_EMBEDDING_DIM = 384
+# Artificial stub latency, to simulate real model cost: a fixed cost per call plus a cost per text/pair
+STUB_EMBED_CALL_LATENCY_MS = 0.0
+STUB_EMBED_ITEM_LATENCY_MS = 0.0
+STUB_RERANK_CALL_LATENCY_MS = 0.0
+STUB_RERANK_PAIR_LATENCY_MS = 0.0
+
 # --- Search Hyperparameters ---
 # Number of top categories to predict for a query (K)
 QUERY_CLASSIFICATION_TOP_K=3
@@ -44,7 +79,147 @@ FALLBACK_CANDIDATE_COUNT=200
 # Batch size for bulk indexing
 BATCH_SIZE = 512
 
+# --- Deadlines & Admission Control ---
+# Default time budget for one search request, in milliseconds. Callers can override it per request.
+SEARCH_DEADLINE_MS = 800
+
+# Threads dedicated to reranker inference (replaces the unbounded default executor)
+INFERENCE_EXECUTOR_WORKERS = 2
+
+# Max rerank jobs allowed to run or wait at once. Beyond this, requests are shed with a 503.
+INFERENCE_MAX_QUEUE_DEPTH = 16
+
+# Value of the Retry-After header (seconds) sent with a shed request
+RETRY_AFTER_SECONDS = 1
+
+# --- Inference Worker Pool ---
+# Number of dedicated reranker processes (CPU only). 0 keeps the reranker in the API process
+# on the bounded thread executor above, which is the right choice on GPU boxes.
+INFERENCE_WORKERS = 0
+
+# Torch intra-op threads per worker. None gives each worker all the cores it is pinned to.
+INFERENCE_THREADS_PER_WORKER = None
+
+# Cores left unpinned for the API process itself (event loop, query embedding, ChromaDB)
+INFERENCE_RESERVED_CORES = 2
+
+# How jobs are assigned to workers: "least_loaded" or "round_robin"
+INFERENCE_DISPATCH = "least_loaded"
+
+# Most (query, doc) pairs scored by one worker job. Larger requests are split across workers.
+# One search's pairs must fit in INFERENCE_MAX_QUEUE_DEPTH such jobs; this is checked at startup.
+INFERENCE_MAX_PAIRS_PER_JOB = 256
+
+# Batch size used by the cross-encoder (in-process and inside each worker)
+RERANK_BATCH_SIZE = 32
+
+# --- Batch Search ---
+# Most queries accepted by one /api/search/batch call
+MAX_BATCH_QUERIES = 64
+
+# Pairs from consecutive queries are scored together until a reranker call holds at least this many
+BATCH_RERANK_MAX_PAIRS = 2048
+
+# Most inference queue slots one batch may hold at once. Each group is scored as jobs of up to
+# INFERENCE_MAX_PAIRS_PER_JOB pairs, so a big batch can't crowd interactive searches out of the queue.
+# Keep it well below INFERENCE_MAX_QUEUE_DEPTH.
+BATCH_MAX_INFERENCE_SLOTS = 4
+
+# How often a batch that finds the inference queue full checks again for a free slot.
+# Admitted batches wait for slots rather than being shed halfway through.
+BATCH_SLOT_POLL_MS = 10
+
+# --- Incremental Indexing ---
+# scripts/incremental_indexer.py follows the product CSV and posts appended rows to the API.
+# Its read position (byte offset, file identity) survives restarts in this file.
+INCREMENTAL_INDEXER_STATE_PATH = Path(DB_PATH) / "incremental_indexer_state.json"
+# How often to check the CSV for new rows when idle
+INCREMENTAL_POLL_SECONDS = 1.0
+# Most products sent per /api/products call (one embedding + upsert batch on the server)
+INCREMENTAL_BATCH_SIZE = 256
+# Attempts per batch before backing off for a poll interval; the batch is never skipped on server errors
+INCREMENTAL_MAX_RETRIES = 5
+INCREMENTAL_REQUEST_TIMEOUT_SECONDS = 60
+# A tail that has a newline but never forms a complete record (e.g. a stray quote in `TV 5" screen`)
+# is skipped up to its next newline: at once if complete rows follow it or it grows past
+# INCREMENTAL_MAX_RECORD_BYTES, otherwise after this many polls without the file growing
+INCREMENTAL_STALLED_POLLS = 10
+INCREMENTAL_MAX_RECORD_BYTES = 1024 * 1024
+
+# --- Result Cache ---
+# Full search results kept in memory, keyed by normalized query. Index writes drop only the
+# entries ranking a written product or retrieved from a written product's subcategory.
+RESULT_CACHE_MAX_ENTRIES = 10000
+RESULT_CACHE_TTL_SECONDS = 3600
+
+# --- Pagination ---
+# Full rankings held for cursor-based paging: total IDs across all sessions, and session lifetime
+RANKING_SESSION_MAX_IDS = 500000
+RANKING_SESSION_TTL_SECONDS = 300
+# Largest page a client may ask for
+MAX_PAGE_SIZE = 100
+
+# --- Cache Warming ---
+# Precompute popular queries in the background after startup and after every index change
+WARM_CACHE_ENABLED = True
+# Ranked query log: one query per line, optionally "query<TAB>count". Used if it exists.
+WARM_QUERY_LOG_PATH = ROOT_DIR / "data" / "popular_queries.txt"
+# Fallback source of popular queries when there is no query log
+WARM_SEED_QUERIES_PATH = ROOT_DIR / "data" / "gemini_generated_queries_live.csv"
+# How many head queries to keep warm
+WARM_TOP_N = 1000
+# Upper bound on warming throughput, in queries; reranker contention is bounded by the settings below
+WARM_QUERIES_PER_SECOND = 20
+# Queries per warming batch (sent through the batch search path)
+WARM_BATCH_SIZE = 4
+# How often the warmer checks for an index version change
+WARM_POLL_SECONDS = 5
+# Warming reranks as background work: jobs of at most this many pairs, this many at a time,
+# each started only while the inference queue is empty. A live search that arrives mid-warm
+# waits for at most WARM_MAX_INFERENCE_SLOTS such jobs.
+WARM_MAX_INFERENCE_SLOTS = 1
+WARM_MAX_PAIRS_PER_JOB = 64
+
+# --- Profiling ---
+# Fraction of API requests to trace and sample. Adjustable at runtime via /api/admin/profiling.
+PROFILING_SAMPLE_RATE = 0.0
+# Requests carrying this header with ADMIN_API_TOKEN as its value are always profiled (off without a token)
+PROFILING_DEBUG_HEADER = "X-Debug-Trace"
+# How often the stack sampler captures every thread's stack while a profiled request is in flight
+PROFILING_SAMPLE_INTERVAL_MS = 5
+# Most recent request traces kept for the admin endpoints
+PROFILING_MAX_TRACES = 200
+# Cap on distinct stacks held per profile; further new stacks are counted as "[truncated]"
+PROFILING_MAX_STACKS = 20000
+
+# Token required in the X-Admin-Token header by /api/admin endpoints. Unset disables the admin
+# endpoints and forced profiling; only PROFILING_SAMPLE_RATE sampling can then profile requests.
+ADMIN_API_TOKEN = os.environ.get("SRP_ADMIN_TOKEN")
+
+# --- Sharding ---
+# "standalone" holds the whole catalogue. In a sharded deployment each "shard" process holds a
+# slice of the products and only retrieves; the "coordinator" classifies intent, fans retrieval
+# out to the shards, merges their candidates and reranks. See commands.txt for a local setup.
+SRP_ROLE = os.environ.get("SRP_ROLE", "standalone")
+# This shard's number (0-based) and the total number of shards
+SHARD_ID = int(os.environ.get("SRP_SHARD_ID", "0"))
+SHARD_COUNT = int(os.environ.get("SRP_SHARD_COUNT", "1"))
+# Coordinator only: comma-separated shard base URLs, in shard ID order
+SHARD_URLS = [url.strip().rstrip("/") for url in os.environ.get("SRP_SHARD_URLS", "").split(",") if url.strip()]
+# How products are assigned to shards: "hash" (crc32 of the PID; every search asks every shard) or
+# "subcategory" (crc32 of the subcategory; a search only asks the shards owning its predicted categories)
+SHARD_PARTITION = os.environ.get("SRP_SHARD_PARTITION", "hash")
+# Per-shard request timeout. Shards that miss it are left out and the result is marked partial.
+SHARD_TIMEOUT_MS = 300
+# How long the coordinator waits for a shard to accept products forwarded by POST /api/products.
+# Forwarding isn't atomic, and with the "subcategory" partition a product moved to another
+# subcategory stays retrievable on its old shard until the shards are rebuilt.
+SHARD_WRITE_TIMEOUT_SECONDS = 30
+# Candidates each shard returns per category. None returns as many as a single node would,
+# which makes the merged candidates exactly the single-node ones; lower trades recall for less traffic.
+SHARD_TOP_M = None
+
 # --- API Configuration ---
-API_BASE_URL = "http://localhost:8000"
+API_BASE_URL = os.environ.get("SRP_API_BASE_URL", "http://localhost:8000")
 
 
@@ -0,0 +1,313 @@
+# app/core/profiling.py
+import contextvars
+import itertools
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# The trace of the request being handled, and the innermost open span within it.
+# Context variables follow the request into asyncio tasks and `asyncio.to_thread` calls.
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# Leaf frames of threads that are just waiting for work. Sampling them only adds noise.
+IDLE_LEAF_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+TRUNCATED_STACK = "[truncated]"
+
+
+class span:
+    """
+    Times a block of code as a named stage of the current request's trace.
+
+    Spans nest: a span opened inside another one (including in tasks gathered from
+    it) becomes its child. When the request isn't being traced this is a no-op that
+    costs one context variable lookup, so stages can stay instrumented in production.
+
+        with span("rerank", pairs=len(pairs)) as s:
+            ...
+            s.set(compute_ms=12.5)
+    """
+    __slots__ = ("name", "attrs", "_trace", "_record", "_token", "_start")
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self._trace = None
+        self._record = None
+
+    def __enter__(self):
+        trace = _current_trace.get()
+        if trace is None:
+            return self
+        self._trace = trace
+        self._start = time.perf_counter()
+        parent = _current_span.get()
+        self._record = {
+            "id": next(trace.span_ids),
+            "parent": parent["id"] if parent is not None else None,
+            "name": self.name,
+            "start_ms": round((self._start - trace.start) * 1000, 3),
+            "duration_ms": None,
+            "attrs": self.attrs,
+        }
+        trace.spans.append(self._record)
+        self._token = _current_span.set(self._record)
+        return self
+
+    def set(self, **attrs):
+        """Adds attributes to the span, e.g. sizes only known once the stage has run."""
+        if self._record is not None:
+            self._record["attrs"].update(attrs)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._record is not None:
+            self._record["duration_ms"] = round((time.perf_counter() - self._start) * 1000, 3)
+            if exc_type is not None:
+                self._record["attrs"]["error"] = exc_type.__name__
+            _current_span.reset(self._token)
+        return False
+
+
+class Trace:
+    """The spans and stack samples recorded for one profiled request."""
+    def __init__(self, name: str, attrs: dict):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self.span_ids = itertools.count()
+        self.samples = Counter()
+
+    def finish(self):
+        self.duration_ms = round((time.perf_counter() - self.start) * 1000, 3)
+
+    def summary(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "attrs": self.attrs,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "span_count": len(self.spans),
+            "sample_count": sum(dict.copy(self.samples).values()),
+        }
+
+    def to_dict(self):
+        return {**self.summary(), "spans": sorted(self.spans, key=lambda s: s["start_ms"])}
+
+
+class StackSampler:
+    """
+    Samples the Python stack of every thread in the process at a fixed interval.
+
+    Only runs while at least one profiled request is in flight. Samples are added to
+    a process-wide profile and to the profile of every trace that is open at the time.
+    The event loop is shared, so a trace's samples also include whatever concurrent
+    requests were doing; its spans are the per-request view.
+    """
+    def __init__(self, interval_ms: float, max_stacks: int):
+        self.interval_seconds = interval_ms / 1000.0
+        self.max_stacks = max_stacks
+        self.profile = Counter()
+        self.sample_count = 0
+        self._traces = set()
+        self._labels = {}  # code object -> frame label
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def attach(self, trace: Trace):
+        with self._lock:
+            self._traces.add(trace)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+
+    def detach(self, trace: Trace):
+        with self._lock:
+            self._traces.discard(trace)
+
+    def reset(self):
+        with self._lock:
+            self.profile = Counter()
+            self.sample_count = 0
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._traces:
+                    # Nothing is being profiled; stop until the next profiled request
+                    self._thread = None
+                    return
+                traces = list(self._traces)
+                profile = self.profile
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = self._collapse(names.get(ident, f"thread-{ident}"), frame)
+                if stack is None:
+                    continue
+                self._add(profile, stack)
+                for trace in traces:
+                    self._add(trace.samples, stack)
+            self.sample_count += 1
+            time.sleep(self.interval_seconds)
+
+    def _add(self, counter: Counter, stack: str):
+        if stack not in counter and len(counter) >= self.max_stacks:
+            stack = TRUNCATED_STACK
+        counter[stack] += 1
+
+    def _collapse(self, thread_name: str, frame):
+        """Formats a stack as one collapsed-stack line: root first, frames separated by ';'."""
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAF_FRAMES:
+            return None
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+                self._labels[code] = label
+            frames.append(label)
+            frame = frame.f_back
+        frames.append(thread_name.replace(";", ","))
+        return ";".join(reversed(frames))
+
+
+def format_collapsed(counter: Counter) -> str:
+    """Renders stack counts in the collapsed format read by flamegraph.pl, speedscope and inferno."""
+    # dict.copy is atomic, so the sampler thread can keep adding while we render
+    snapshot = dict.copy(counter)
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(snapshot.items(), key=lambda e: e[1], reverse=True))
+
+
+class RequestProfiler:
+    """
+    Opt-in, runtime-switchable request profiling.
+
+    A request is profiled if it carries the debug header or is picked by
+    `sample_rate`. Profiled requests get a span trace of every instrumented stage,
+    and run the stack sampler while they are in flight. Finished traces are kept
+    in a ring buffer of the most recent `max_traces`.
+    """
+    def __init__(self, sample_rate: float, interval_ms: float, max_traces: int, max_stacks: int):
+        self.sample_rate = sample_rate
+        self.sampler = StackSampler(interval_ms, max_stacks)
+        self.traces = deque(maxlen=max_traces)
+        self.profiled_requests = 0
+
+    def should_profile(self, forced: bool = False) -> bool:
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def profile(self, name: str, **attrs):
+        """Traces and samples everything run inside the block as one request."""
+        trace = Trace(name, attrs)
+        token = _current_trace.set(trace)
+        self.sampler.attach(trace)
+        self.profiled_requests += 1
+        try:
+            yield trace
+        finally:
+            self.sampler.detach(trace)
+            _current_trace.reset(token)
+            trace.finish()
+            self.traces.append(trace)
+
+    def get_trace(self, trace_id: str):
+        for trace in self.traces:
+            if trace.trace_id == trace_id:
+                return trace
+        return None
+
+    def configure(self, sample_rate=None, interval_ms=None):
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if interval_ms is not None:
+            self.sampler.interval_seconds = interval_ms / 1000.0
+        logger.info(f"Profiling configured: sample_rate={self.sample_rate}, "
+                    f"interval={self.sampler.interval_seconds * 1000:.1f}ms")
+
+    def reset(self):
+        """Clears the process-wide profile and the stored traces."""
+        self.sampler.reset()
+        self.traces.clear()
+
+    def status(self):
+        return {
+            "sample_rate": self.sample_rate,
+            "interval_ms": round(self.sampler.interval_seconds * 1000, 3),
+            "sampler_running": self.sampler.running,
+            "profiled_requests": self.profiled_requests,
+            "stored_traces": len(self.traces),
+            "samples": self.sampler.sample_count,
+            "distinct_stacks": len(self.sampler.profile),
+        }
+
+
+class RequestProfilingMiddleware:
+    """
+    ASGI middleware that runs the API requests picked by a `RequestProfiler` inside
+    `profile()` and returns the trace ID in an X-Trace-Id header.
+
+    Written against raw ASGI rather than as a BaseHTTPMiddleware: requests that
+    aren't profiled go straight to the app, with no extra task or response
+    streaming wrapped around them.
+    """
+    def __init__(self, app, profiler: RequestProfiler, debug_header: str, admin_token=None):
+        self.app = app
+        self.profiler = profiler
+        self.debug_header = debug_header.lower().encode("latin-1")
+        self.admin_token = admin_token.encode("utf-8") if admin_token else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        if not path.startswith("/api/") or path.startswith("/api/admin/"):
+            return await self.app(scope, receive, send)
+        if not self.profiler.should_profile(self._forced(scope)):
+            return await self.app(scope, receive, send)
+
+        with self.profiler.profile(f"{scope['method']} {path}") as trace:
+            trace_header = (b"x-trace-id", trace.trace_id.encode("latin-1"))
+
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    message = {**message, "headers": [*message.get("headers", []), trace_header]}
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
+
+    def _forced(self, scope) -> bool:
+        # Only callers who know the admin token can force a profile; without a token, nobody can
+        if self.admin_token is None:
+            return False
+        for name, value in scope["headers"]:
+            if name == self.debug_header:
+                return secrets.compare_digest(value, self.admin_token)
+        return False
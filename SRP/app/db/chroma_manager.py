@@ -1,9 +1,15 @@
 # app/db/chroma_manager.py
     
+import asyncio
 import chromadb
-from ..core.config import DB_PATH
+import numpy as np
+from ..core.config import (
+    DB_PATH, PRODUCT_COLLECTION_NAME, PRODUCT_VECTOR_STORAGE, COMPACT_VECTOR_STORE_PATH, COMPACT_RESCORE_FACTOR
+)
+from .compact_vector_store import CompactVectorStore
+from ..core.profiling import span
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 
 logger = logging.getLogger(__name__)
 
@@ -11,23 +17,39 @@ class ChromaManager:
     def __init__(self):
         self.client = chromadb.PersistentClient(path=DB_PATH)
         logger.info("ChromaDB client initialized.")
+        # In compact mode, product vectors bypass ChromaDB entirely
+        self.compact_store = None
+        if PRODUCT_VECTOR_STORAGE != "chroma":
+            self.compact_store = CompactVectorStore(
+                COMPACT_VECTOR_STORE_PATH, dtype=PRODUCT_VECTOR_STORAGE, rescore_factor=COMPACT_RESCORE_FACTOR
+            )
+
+    def _compact_store_for(self, collection_name):
+        return self.compact_store if collection_name == PRODUCT_COLLECTION_NAME else None
 
     def add_items_to_collection(
         self,
         collection_name: str,
         ids: List[str],
         documents: List[str],
-        embeddings: List[List[float]],
+        embeddings: Union[np.ndarray, List[List[float]]],
         metadatas: Optional[List[Dict[str, Any]]] = None
     ):
         """
-        Adds a batch of items to a specified collection.
+        Adds a batch of items to a specified collection, overwriting items whose IDs already exist.
         The caller is responsible for batching the data.
+        Pass embeddings as the encoder's NumPy array; converting to nested lists first is wasted work.
         """
+        compact_store = self._compact_store_for(collection_name)
+        if compact_store is not None:
+            compact_store.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+            return
+
         collection = self.client.get_or_create_collection(name=collection_name)
         
-        # Directly add the provided batch. No internal looping.
-        collection.add(
+        # Directly upsert the provided batch. No internal looping. Upsert (not add), because
+        # re-sent products must replace the stored ones: `add` silently keeps the old entry.
+        collection.upsert(
             ids=ids,
             documents=documents,
             embeddings=embeddings,
@@ -36,10 +58,18 @@ class ChromaManager:
         # We don't log here to avoid spamming the console from the indexer's loop.
 
     async def aquery_collection(self, collection_name, query_embedding, n_results=100, where_filter=None):
-        # This part remains the same
-        collection = self.client.get_collection(name=collection_name)
-        return collection.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=n_results,
-            where=where_filter
-        )
\ No newline at end of file
+        compact_store = self._compact_store_for(collection_name)
+        with span("vector.query", collection=collection_name, n_results=n_results, where=where_filter,
+                  backend="compact" if compact_store is not None else "chroma"):
+            if compact_store is not None:
+                return await asyncio.to_thread(compact_store.query, query_embedding, n_results=n_results, where=where_filter)
+
+            collection = self.client.get_collection(name=collection_name)
+            # The ChromaDB client is synchronous. Running the query in a thread lets
+            # callers that gather several queries actually overlap them.
+            return await asyncio.to_thread(
+                collection.query,
+                query_embeddings=[query_embedding.tolist()],
+                n_results=n_results,
+                where=where_filter
+            )
\ No newline at end of file
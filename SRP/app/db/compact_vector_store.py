@@ -0,0 +1,404 @@
+# app/db/compact_vector_store.py
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: the writer lock only covers threads of this process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Rows scanned per step during the quantized scan, to bound temporary float32 copies
+SCAN_CHUNK_ROWS = 65536
+# int8 scales are fitted with some headroom so later batches rarely force a requantization
+INT8_SCALE_HEADROOM = 1.1
+INITIAL_CAPACITY = 1024
+# The row log is rewritten with only the latest record per row once it holds this many
+# records per live row (every update of a product appends a record)
+ROW_LOG_COMPACTION_RATIO = 2
+
+
+class CompactVectorStore:
+    """
+    A memory-mapped, flat vector index that stores product vectors compactly.
+
+    Vectors are kept twice on disk: as float16 or per-dimension scaled int8 codes
+    (`codes.bin`, the part that is scanned and stays hot in RAM), and as float32
+    (`vectors.f32`, touched only for the few rows being rescored). A query scans
+    the compact codes for the `n_results * rescore_factor` nearest rows, then
+    rescores those exactly against the float32 vectors.
+
+    Each row's ID, document and metadata are a JSON record in an append-only row
+    log. Only the PID -> row map, each row's subcategory code and the byte offset
+    of its latest record are held in RAM; documents are read from the log for the
+    rows a query returns. The log is compacted once superseded records pile up.
+
+    Several processes (the API and the bulk indexer) can use one store: writers
+    take an exclusive file lock, and every process catches up with the others'
+    writes before assigning rows or scanning.
+
+    Only what the search service needs from ChromaDB is supported: upserts, and
+    queries with an optional `{"subcategory": {"$eq": ...}}` filter. Results use
+    ChromaDB's query result shape and squared-L2 distances, so callers can't tell
+    the two apart.
+    """
+    def __init__(self, path: Path, dtype: str = "int8", rescore_factor: int = 4):
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported compact vector dtype: '{dtype}'")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.rescore_factor = rescore_factor
+        self._lock = threading.Lock()
+        self._lock_file = open(self.path / "write.lock", "a+")
+
+        meta_path = self.path / "meta.json"
+        if meta_path.exists():
+            stored_dtype = json.loads(meta_path.read_text())["dtype"]
+            if stored_dtype != dtype:
+                raise ValueError(f"Compact store at '{self.path}' holds {stored_dtype} vectors, not {dtype}. Re-index to switch.")
+        self.dtype = dtype
+        self.dim = None
+        self.count = 0
+        self.capacity = 0
+        self.codes = self.vectors = self.scales = None
+        self._meta_stamp = None
+        self._reset_rows(0)
+        with self._lock:
+            self._sync()
+        logger.info(f"Compact vector store ({self.dtype}) opened at '{self.path}' with {self.count} vectors.")
+
+    # --- Cross-process consistency ---
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _stat_meta(self):
+        # meta.json is replaced on every write, so a new inode means another process wrote
+        try:
+            st = os.stat(self.path / "meta.json")
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _sync(self, locked: bool = False):
+        """
+        Catches up with writes made since this process last looked, by this or
+        another process. Cheap (one stat) when nothing changed. Caller holds `_lock`;
+        `locked` means it also holds the exclusive file lock.
+        """
+        if self._stat_meta() == self._meta_stamp:
+            return
+        if locked:
+            self._catch_up()
+        else:
+            with self._file_lock(exclusive=False):
+                self._catch_up()
+
+    def _catch_up(self):
+        self._meta_stamp = self._stat_meta()
+        if self._meta_stamp is None:
+            return
+        meta = json.loads((self.path / "meta.json").read_text())
+        if meta.get("log_generation", 0) != self._log_generation:
+            # The row log was compacted: rebuild the row index from the new one
+            self._reset_rows(meta.get("log_generation", 0))
+        self.dim = meta["dim"]
+        self.count = meta["count"]
+        if meta["capacity"] != self.capacity or (self.codes is None and self.dim is not None):
+            self.capacity = meta["capacity"]
+            self._open_arrays()
+            self.norms = _padded(self.norms, self.capacity, 0.0)
+        scales_path = self.path / "scales.npy"
+        self.scales = np.load(scales_path) if scales_path.exists() else None
+
+        changed = self._replay_log()
+        # Squared norms of the float32 vectors, for the L2 expansion ||x||^2 - 2x.q
+        if self.dim is not None and changed:
+            rows = np.array(sorted(changed), dtype=np.int64)
+            for start in range(0, len(rows), SCAN_CHUNK_ROWS):
+                chunk_rows = rows[start:start + SCAN_CHUNK_ROWS]
+                chunk = np.asarray(self.vectors[chunk_rows])
+                self.norms[chunk_rows] = np.einsum("ij,ij->i", chunk, chunk)
+
+    # --- Row log ---
+    def _log_path(self, generation: int) -> Path:
+        return self.path / ("rows.jsonl" if generation == 0 else f"rows.{generation}.jsonl")
+
+    def _reset_rows(self, log_generation: int):
+        self._log_generation = log_generation
+        self._log_size = 0  # Bytes of the row log already applied
+        self._log_records = 0
+        self._row_of: Dict[str, int] = {}
+        self._subcategory_codes: Dict[str, int] = {}
+        size = max(self.capacity, INITIAL_CAPACITY)
+        self._row_subcategory = np.full(size, -1, dtype=np.int32)
+        self._record_offset = np.zeros(size, dtype=np.int64)
+        self.norms = np.zeros(self.capacity, dtype=np.float32)
+
+    def _replay_log(self):
+        """Applies records appended to the row log since the last replay. Returns the rows they touched."""
+        log_path = self._log_path(self._log_generation)
+        if not log_path.exists():
+            return set()
+        with open(log_path, "rb") as f:
+            f.seek(self._log_size)
+            data = f.read()
+        # A trailing line without a newline is a write that didn't complete
+        data = data[:data.rfind(b"\n") + 1]
+        changed = set()
+        offset = self._log_size
+        for line in data.splitlines(keepends=True):
+            record = json.loads(line)
+            self._set_row(record["row"], record["id"], record["metadata"], offset)
+            changed.add(record["row"])
+            offset += len(line)
+            self._log_records += 1
+        self._log_size = offset
+        return changed
+
+    def _set_row(self, r, pid, metadata, record_offset):
+        self._row_of[pid] = r
+        subcategory = (metadata or {}).get("subcategory")
+        code = self._subcategory_codes.setdefault(subcategory, len(self._subcategory_codes))
+        if r >= len(self._row_subcategory):
+            size = max(r + 1, 2 * len(self._row_subcategory))
+            self._row_subcategory = _padded(self._row_subcategory, size, -1)
+            self._record_offset = _padded(self._record_offset, size, 0)
+        self._row_subcategory[r] = code
+        self._record_offset[r] = record_offset
+
+    def _read_records(self, rows):
+        """The row log records of `rows`. Caller holds `_lock`."""
+        try:
+            return self._read_records_from_log(rows)
+        except FileNotFoundError:
+            # Another process compacted the log since our last sync
+            self._sync()
+            return self._read_records_from_log(rows)
+
+    def _read_records_from_log(self, rows):
+        records = []
+        with open(self._log_path(self._log_generation), "rb") as f:
+            for r in rows:
+                f.seek(int(self._record_offset[r]))
+                records.append(json.loads(f.readline()))
+        return records
+
+    def _compact_log(self):
+        """Rewrites the row log with only each row's latest record. Caller holds both locks."""
+        old_path = self._log_path(self._log_generation)
+        new_generation = self._log_generation + 1
+        offsets = np.zeros(len(self._record_offset), dtype=np.int64)
+        with open(old_path, "rb") as src, open(self._log_path(new_generation), "wb") as dst:
+            for r in range(self.count):
+                src.seek(int(self._record_offset[r]))
+                offsets[r] = dst.tell()
+                dst.write(src.readline())
+            size = dst.tell()
+        superseded = self._log_records - self.count
+        self._record_offset = offsets
+        self._log_generation, self._log_size, self._log_records = new_generation, size, self.count
+        # Point readers at the new log before the old one disappears
+        self._write_meta()
+        old_path.unlink()
+        logger.info(f"Compacted the row log: dropped {superseded} superseded records, kept {self.count}.")
+
+    # --- Persistence ---
+    def _open_arrays(self):
+        code_dtype = np.int8 if self.dtype == "int8" else np.float16
+        self.codes = np.memmap(self.path / "codes.bin", dtype=code_dtype, mode="r+", shape=(self.capacity, self.dim))
+        self.vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+    def _grow(self, needed: int):
+        """Extends the memory-mapped files to hold at least `needed` rows."""
+        new_capacity = max(INITIAL_CAPACITY, self.capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+        if new_capacity == self.capacity:
+            return
+        code_itemsize = 1 if self.dtype == "int8" else 2
+        for name, itemsize in (("codes.bin", code_itemsize), ("vectors.f32", 4)):
+            with open(self.path / name, "ab") as f:
+                f.truncate(new_capacity * self.dim * itemsize)
+        if self.codes is not None:
+            self.codes.flush()
+            self.vectors.flush()
+        self.capacity = new_capacity
+        self._open_arrays()
+        self.norms = _padded(self.norms, new_capacity, 0.0)
+
+    def _write_meta(self):
+        meta = {
+            "dtype": self.dtype, "dim": self.dim, "count": self.count, "capacity": self.capacity,
+            "log_generation": self._log_generation,
+        }
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta))
+        tmp.replace(self.path / "meta.json")
+        self._meta_stamp = self._stat_meta()
+
+    # --- Quantization ---
+    def _quantize(self, vectors: np.ndarray) -> np.ndarray:
+        if self.dtype == "float16":
+            return vectors.astype(np.float16)
+        return np.clip(np.rint(vectors / self.scales), -127, 127).astype(np.int8)
+
+    def _fit_scales(self, vectors: np.ndarray):
+        """Fits per-dimension int8 scales, requantizing stored rows if the range grew."""
+        batch_max = np.abs(vectors).max(axis=0)
+        if self.scales is not None and np.all(batch_max <= self.scales * 127):
+            return
+        stored_max = self.scales * 127 / INT8_SCALE_HEADROOM if self.scales is not None else 0.0
+        new_max = np.maximum(batch_max, stored_max)
+        self.scales = (np.maximum(new_max, 1e-8) * INT8_SCALE_HEADROOM / 127).astype(np.float32)
+        np.save(self.path / "scales.npy", self.scales)
+        if self.count:
+            logger.info(f"Vector range grew; requantizing {self.count} stored vectors.")
+            for start in range(0, self.count, SCAN_CHUNK_ROWS):
+                end = min(start + SCAN_CHUNK_ROWS, self.count)
+                self.codes[start:end] = self._quantize(np.asarray(self.vectors[start:end]))
+
+    # --- Public API ---
+    def upsert(self, ids: List[str], documents: List[str], embeddings, metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Inserts or overwrites a batch of vectors. `embeddings` may be any (n, dim) array-like."""
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("embeddings must be a (len(ids), dim) array")
+        metadatas = metadatas or [{} for _ in ids]
+
+        with self._lock, self._file_lock(exclusive=True):
+            # Rows are assigned from the latest on-disk state, never from what this process saw earlier
+            self._sync(locked=True)
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-d vectors, got {vectors.shape[1]}-d")
+
+            # Existing ids are overwritten in place; new ids are appended
+            assigned = {}
+            next_row = self.count
+            for pid in ids:
+                if pid not in assigned:
+                    assigned[pid] = self._row_of.get(pid)
+                    if assigned[pid] is None:
+                        assigned[pid] = next_row
+                        next_row += 1
+            rows = np.array([assigned[pid] for pid in ids], dtype=np.int64)
+            self._grow(next_row)
+            if self.dtype == "int8":
+                self._fit_scales(vectors)
+
+            self.vectors[rows] = vectors
+            self.codes[rows] = self._quantize(vectors)
+            self.norms[rows] = np.einsum("ij,ij->i", vectors, vectors)
+            self.codes.flush()
+            self.vectors.flush()
+
+            lines = [
+                (json.dumps({"row": r, "id": pid, "document": doc, "metadata": meta}) + "\n").encode("utf-8")
+                for r, pid, doc, meta in zip(rows.tolist(), ids, documents, metadatas)
+            ]
+            with open(self._log_path(self._log_generation), "ab") as f:
+                f.write(b"".join(lines))
+            offset = self._log_size
+            for r, pid, meta, line in zip(rows.tolist(), ids, metadatas, lines):
+                self._set_row(r, pid, meta, offset)
+                offset += len(line)
+            self._log_size = offset
+            self._log_records += len(lines)
+            self.count = next_row
+
+            if self._log_records > ROW_LOG_COMPACTION_RATIO * max(self.count, INITIAL_CAPACITY):
+                self._compact_log()
+            self._write_meta()
+
+    def query(self, query_embedding, n_results: int = 100, where: Optional[Dict[str, Any]] = None):
+        """
+        Finds the nearest stored vectors to `query_embedding`.
+
+        Returns:
+            dict: ChromaDB-shaped results with `ids`, `documents`, `metadatas` and
+                  `distances` (squared L2), each wrapped in a one-element list.
+        """
+        empty = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        with self._lock:
+            self._sync()
+            count, codes, vectors, norms, scales = self.count, self.codes, self.vectors, self.norms, self.scales
+            rows = self._filter_rows(where, count)
+        if count == 0:
+            return empty
+        if rows is not None and len(rows) == 0:
+            return empty
+
+        q = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+
+        # Stage 1: approximate squared L2 over the compact codes (||q||^2 is constant and dropped)
+        q_codes = q * scales if self.dtype == "int8" else q
+        n_total = count if rows is None else len(rows)
+        approx = np.empty(n_total, dtype=np.float32)
+        for start in range(0, n_total, SCAN_CHUNK_ROWS):
+            end = min(start + SCAN_CHUNK_ROWS, n_total)
+            chunk_rows = slice(start, end) if rows is None else rows[start:end]
+            chunk = np.asarray(codes[chunk_rows], dtype=np.float32)
+            approx[start:end] = norms[chunk_rows] - 2.0 * (chunk @ q_codes)
+
+        # Stage 2: exact rescoring of the shortlist against the float32 vectors
+        n_shortlist = min(n_results * self.rescore_factor, n_total)
+        shortlist = np.argpartition(approx, n_shortlist - 1)[:n_shortlist]
+        shortlist_rows = shortlist if rows is None else rows[shortlist]
+        shortlist_rows = np.sort(shortlist_rows)  # Sequential reads from the memory map
+        diffs = np.asarray(vectors[shortlist_rows]) - q
+        exact = np.einsum("ij,ij->i", diffs, diffs)
+
+        order = np.argsort(exact)[:n_results]
+        best_rows = shortlist_rows[order].tolist()
+        with self._lock:
+            records = self._read_records(best_rows)
+        return {
+            "ids": [[r["id"] for r in records]],
+            "documents": [[r["document"] for r in records]],
+            "metadatas": [[r["metadata"] for r in records]],
+            "distances": [exact[order].tolist()],
+        }
+
+    def _filter_rows(self, where, count):
+        """Resolves a `where` filter to row indices, or None for all rows."""
+        if not where:
+            return None
+        condition = where.get("subcategory") if len(where) == 1 else None
+        if not isinstance(condition, dict) or list(condition) != ["$eq"]:
+            raise ValueError(f"Compact vector store only supports subcategory $eq filters, got {where}")
+        code = self._subcategory_codes.get(condition["$eq"])
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self._row_subcategory[:count] == code)
+
+    def nbytes(self):
+        """
+        Approximate resident size of what every query touches: the compact codes and
+        the per-row norms, subcategory codes and record offsets. Documents stay on disk.
+        """
+        code_itemsize = 1 if self.dtype == "int8" else 2
+        return self.count * (self.dim or 0) * code_itemsize + self.count * (4 + 4 + 8)
+
+
+def _padded(array: np.ndarray, size: int, fill) -> np.ndarray:
+    """Returns `array` grown to `size` elements, new elements set to `fill`."""
+    grown = np.full(size, fill, dtype=array.dtype)
+    grown[:len(array)] = array[:size]
+    return grown
@@ -0,0 +1,278 @@
+# app/db/product_store.py
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KEY_COLUMN = "pid"
+# Names the version directory readers should use. Replaced atomically by `build`.
+CURRENT_FILE = "CURRENT"
+# Cell types a column can declare in schema.json. Cells are stored as text either way;
+# typed columns are converted back on read, so prices come back as numbers.
+COLUMN_TYPES = ("str", "int", "float")
+
+
+def _encode(value) -> bytes:
+    """Column cell encoding. Missing values (None/NaN) are stored as empty strings."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return b""
+    return str(value).encode("utf-8")
+
+
+def _decode(raw: bytes, column_type: str):
+    text = raw.decode("utf-8")
+    if column_type == "str":
+        return text
+    try:
+        number = float(text)
+    except ValueError:
+        return text  # e.g. a product sent through the API with a non-numeric price
+    return int(number) if column_type == "int" and number.is_integer() else number
+
+
+class _Column:
+    """
+    One variable-length string column: `<name>.data` holds the UTF-8 bytes of every
+    cell back to back, `<name>.offsets` holds each cell's end offset as int64.
+    Both files are append-only and memory-mapped for reads.
+    """
+    def __init__(self, path: Path, name: str, column_type: str = "str"):
+        self.data_path = path / f"{name}.data"
+        self.offsets_path = path / f"{name}.offsets"
+        self.type = column_type
+        self.data_path.touch()
+        self.offsets_path.touch()
+        self.offsets = self.data = None
+        self.reopen()
+
+    def reopen(self):
+        n_rows = self.offsets_path.stat().st_size // 8
+        data_size = self.data_path.stat().st_size
+        self.offsets = np.memmap(self.offsets_path, dtype=np.int64, mode="r", shape=(n_rows,)) if n_rows else np.zeros(0, np.int64)
+        self.data = np.memmap(self.data_path, dtype=np.uint8, mode="r", shape=(data_size,)) if data_size else np.zeros(0, np.uint8)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get(self, row: int):
+        end = int(self.offsets[row])
+        start = int(self.offsets[row - 1]) if row > 0 else 0
+        return _decode(self.data[start:end].tobytes(), self.type) if end > start else None
+
+    def append(self, values: Sequence[Any]):
+        cells = [_encode(v) for v in values]
+        # Offsets continue from the data file as it is on disk, not from our (possibly stale) map of it
+        end = self.data_path.stat().st_size
+        ends = end + np.cumsum([len(c) for c in cells], dtype=np.int64)
+        with open(self.data_path, "ab") as f:
+            f.write(b"".join(cells))
+        with open(self.offsets_path, "ab") as f:
+            f.write(ends.tobytes())
+
+
+class _Table:
+    """One version of the store: its schema, columns and PID index."""
+    def __init__(self, path: Path, fields: List[str], types: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        schema_path = self.path / "schema.json"
+        if schema_path.exists():
+            # The schema on disk wins; it's what the columns were built with
+            schema = json.loads(schema_path.read_text())
+        else:
+            types = types or {}
+            unknown = {t for t in types.values() if t not in COLUMN_TYPES}
+            if unknown:
+                raise ValueError(f"Unknown product store column types {sorted(unknown)}; use one of {COLUMN_TYPES}")
+            schema = {"fields": list(fields), "types": {name: types.get(name, "str") for name in fields}}
+            schema_path.write_text(json.dumps(schema))
+        self.fields = schema["fields"]
+        self.types = {name: schema.get("types", {}).get(name, "str") for name in self.fields}
+        self.key = _Column(self.path, KEY_COLUMN)
+        self.columns = {name: _Column(self.path, name, self.types[name]) for name in self.fields}
+        self.row_of = {}
+        for row in range(len(self.key)):
+            self.row_of[self.key.get(row)] = row  # Later rows for the same PID win
+
+    def append(self, pids: List[str], columns: Dict[str, Sequence[Any]]):
+        first_row = len(self.key)
+        # Key column last, so a reader never sees a PID whose fields aren't written yet
+        for name in self.fields:
+            self.columns[name].append(columns.get(name, [None] * len(pids)))
+            self.columns[name].reopen()
+        self.key.append(pids)
+        self.key.reopen()
+        for i, pid in enumerate(pids):
+            self.row_of[pid] = first_row + i
+
+
+class ColumnarProductStore:
+    """
+    An in-process, memory-mapped columnar store of product display fields, keyed by PID.
+
+    Lets the search API return hydrated results (name, price, image, ...) without a
+    round trip to another database. Built in full by the bulk indexer and appended to
+    by `insert_products`; an updated product gets a new row and the PID index points
+    at the latest one.
+
+    Each build goes to a new version directory, and `CURRENT` names the one to use.
+    Open stores notice a new `CURRENT` on their next lookup, load it on a background
+    thread while they keep serving the previous version, then switch to it. So the
+    bulk indexer can rebuild while the API is serving, and no lookup waits for the
+    new version's PID index to be built.
+    """
+    def __init__(self, path: Path, fields: List[str], types: Optional[Dict[str, str]] = None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._current_stamp = None
+        self._loading_stamp = None  # CURRENT stamp whose version is being loaded in the background
+        self._table = None
+        if not (self.path / CURRENT_FILE).exists():
+            if (self.path / "schema.json").exists():
+                # Store from before versioning: its columns sit directly in `path`
+                self._table = _Table(self.path, fields)
+            else:
+                _write_current(self.path, _new_version(self.path, fields, types).path.name)
+        self._refresh()
+        logger.info(f"Product store opened at '{self._table.path}' with {len(self)} products.")
+
+    @classmethod
+    def build(cls, path: Path, pids: Sequence[str], columns: Dict[str, Sequence[Any]],
+              types: Optional[Dict[str, str]] = None):
+        """
+        Writes a fresh store from whole columns and makes it the current version.
+
+        Stores that are open elsewhere start loading the new version on their
+        next lookup and switch once it is loaded; products upserted into the old
+        version in the meantime aren't carried over.
+
+        Args:
+            path (Path): Where the store lives.
+            pids (Sequence[str]): The key column.
+            columns (dict): Field name -> one value per PID.
+            types (dict, optional): Field name -> one of COLUMN_TYPES. Unlisted fields are 'str'.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        previous = _read_current(path)
+        table = _new_version(path, list(columns), types)
+        table.append(list(pids), columns)
+        _write_current(path, table.path.name)
+        # Keep the previous version: a process may be between reading CURRENT and opening it
+        _remove_stale_versions(path, keep={table.path.name, previous})
+        return cls(path, list(columns), types)
+
+    def _refresh(self):
+        """
+        Starts switching to the version named by CURRENT if it changed. One stat when it hasn't.
+        Only the first open loads a version on the caller's thread.
+        """
+        try:
+            st = os.stat(self.path / CURRENT_FILE)
+        except FileNotFoundError:
+            return  # Store from before versioning
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp == self._current_stamp or stamp == self._loading_stamp:
+            return
+        with self._lock:
+            if stamp == self._current_stamp or stamp == self._loading_stamp:
+                return
+            self._loading_stamp = stamp
+            first_open = self._table is None
+        if first_open:
+            self._load_version(stamp)
+        else:
+            threading.Thread(target=self._load_version, args=(stamp,), name="product-store-load", daemon=True).start()
+
+    def _load_version(self, stamp):
+        """Opens the version CURRENT names and swaps it in, unless a newer one started loading meanwhile."""
+        version = None
+        try:
+            version = _read_current(self.path)
+            table = self._table
+            if table is None or table.path.name != version:
+                table = _Table(self.path / version, [])  # Decodes every PID: the slow part
+        except Exception as e:
+            if self._table is None:
+                raise  # Nothing to keep serving from
+            logger.error(f"Could not load product store version '{version}': {e}")
+            with self._lock:
+                if self._loading_stamp == stamp:
+                    self._loading_stamp = None  # Retried on the next lookup
+            return
+        with self._lock:
+            if self._loading_stamp != stamp:
+                return
+            switched = self._table is not None and self._table is not table
+            self._table, self._current_stamp, self._loading_stamp = table, stamp, None
+        if switched:
+            logger.info(f"Product store switched to version '{version}' with {len(self)} products.")
+
+    @property
+    def fields(self) -> List[str]:
+        return self._table.fields
+
+    def __len__(self):
+        return len(self._table.row_of)
+
+    def upsert(self, records: List[Dict[str, Any]]):
+        """Adds or replaces products. Each record needs a 'pid'; unknown keys are ignored."""
+        if not records:
+            return
+        self._refresh()
+        pids = [r[KEY_COLUMN] for r in records]
+        with self._lock:
+            table = self._table
+            table.append(pids, {name: [r.get(name) for r in records] for name in table.fields})
+
+    def get_many(self, pids: List[str], fields: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Looks up the given fields for each PID, preserving order.
+
+        Returns:
+            list: One dict per PID, or None where the PID isn't in the store.
+                  Numeric columns come back as numbers.
+        """
+        self._refresh()
+        table = self._table
+        columns = [(name, table.columns[name]) for name in fields]
+        results = []
+        for pid in pids:
+            row = table.row_of.get(pid)
+            results.append(None if row is None else {name: column.get(row) for name, column in columns})
+        return results
+
+
+def _new_version(path: Path, fields: List[str], types: Optional[Dict[str, str]]) -> _Table:
+    return _Table(path / f"v{time.time_ns()}", fields, types)
+
+
+def _read_current(path: Path) -> Optional[str]:
+    try:
+        return (path / CURRENT_FILE).read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _write_current(path: Path, version: str):
+    tmp = path / (CURRENT_FILE + ".tmp")
+    tmp.write_text(version)
+    tmp.replace(path / CURRENT_FILE)
+
+
+def _remove_stale_versions(path: Path, keep):
+    for entry in path.iterdir():
+        if entry.is_dir() and entry.name.startswith("v") and entry.name not in keep:
+            shutil.rmtree(entry, ignore_errors=True)
+        elif entry.is_file() and (entry.suffix in (".data", ".offsets") or entry.name == "schema.json"):
+            entry.unlink()  # Columns of a store from before versioning
@@ -1,12 +1,36 @@
 # app/main.py
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .api.routers import router as api_router
+from .api.routers import router as api_router, search_service, cache_warmer, request_profiler
+from .core.config import WARM_CACHE_ENABLED, PROFILING_DEBUG_HEADER, ADMIN_API_TOKEN, SRP_ROLE
+from .core.profiling import RequestProfilingMiddleware
 
 
-app = FastAPI(title="Flipkart Search Service")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Precompute popular queries in the background; live traffic is served meanwhile.
+    # Shards don't serve searches themselves, so there is nothing for them to warm.
+    warm_task = asyncio.create_task(cache_warmer.run()) if WARM_CACHE_ENABLED and SRP_ROLE != "shard" else None
+    yield
+    if warm_task is not None:
+        warm_task.cancel()
+    if search_service.shards is not None:
+        await search_service.shards.aclose()
+    # Stop inference workers so they don't outlive the API process on reload/shutdown
+    search_service.shutdown()
+
+
+app = FastAPI(title="Flipkart Search Service", lifespan=lifespan)
+
+# Traces and samples API requests picked by the profiler's sample rate or the debug header
+app.add_middleware(
+    RequestProfilingMiddleware,
+    profiler=request_profiler, debug_header=PROFILING_DEBUG_HEADER, admin_token=ADMIN_API_TOKEN
+)
 
 app.include_router(api_router, prefix="/api")
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to the Flipkart Search API"}
\ No newline at end of file
+    return {"message": "Welcome to the Flipkart Search API"}
@@ -1,19 +1,66 @@
 # app/models/model_loader.py
-import torch
-from sentence_transformers import SentenceTransformer, CrossEncoder
-from ..core.config import EMBEDDING_MODEL, RERANKER_MODEL
+import threading
+from ..core.config import (
+    EMBEDDING_MODEL, RERANKER_MODEL, MODEL_BACKEND, STUB_EMBEDDING_DIM,
+    STUB_EMBED_CALL_LATENCY_MS, STUB_EMBED_ITEM_LATENCY_MS, STUB_RERANK_CALL_LATENCY_MS, STUB_RERANK_PAIR_LATENCY_MS
+)
 
-device = 'cuda' if torch.cuda.is_available() else 'cpu'
-print(f"Loading models on device: {device}")
+# This dictionary will hold the loaded models. They are loaded on first use, so
+# importing this module never downloads anything, and processes only load the
+# models they actually need.
+models = {}
+_lock = threading.Lock()
+
+
+def get_device():
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def load_embedding_model(device=None):
+    """Builds a new bi-encoder for the configured MODEL_BACKEND."""
+    if MODEL_BACKEND == "stub":
+        from .stub_models import StubEmbeddingModel
+        return StubEmbeddingModel(STUB_EMBEDDING_DIM, STUB_EMBED_CALL_LATENCY_MS, STUB_EMBED_ITEM_LATENCY_MS)
+    if MODEL_BACKEND == "sentence_transformers":
+        from sentence_transformers import SentenceTransformer
+        device = device or get_device()
+        print(f"Loading embedding model on device: {device}")
+        return SentenceTransformer(EMBEDDING_MODEL, device=device)
+    raise ValueError(f"Unknown MODEL_BACKEND: '{MODEL_BACKEND}'")
+
+
+def load_reranker_model(device=None):
+    """Builds a new cross-encoder for the configured MODEL_BACKEND."""
+    if MODEL_BACKEND == "stub":
+        from .stub_models import StubCrossEncoder
+        return StubCrossEncoder(STUB_RERANK_CALL_LATENCY_MS, STUB_RERANK_PAIR_LATENCY_MS)
+    if MODEL_BACKEND == "sentence_transformers":
+        from sentence_transformers import CrossEncoder
+        device = device or get_device()
+        print(f"Loading reranker model on device: {device}")
+        return CrossEncoder(RERANKER_MODEL, device=device, max_length=512)
+    raise ValueError(f"Unknown MODEL_BACKEND: '{MODEL_BACKEND}'")
+
+
+def limit_inference_threads(num_threads: int):
+    """Caps the backend's intra-op threads in this process (used by inference workers)."""
+    if MODEL_BACKEND == "sentence_transformers":
+        import torch
+        torch.set_num_threads(num_threads)
+        torch.set_num_interop_threads(1)
+
+
+def _get(name, loader):
+    if name not in models:
+        with _lock:
+            if name not in models:
+                models[name] = loader()
+    return models[name]
 
-# This dictionary will hold the loaded models
-models = {
-    "embedding_model": SentenceTransformer(EMBEDDING_MODEL, device=device),
-    "reranker_model": CrossEncoder(RERANKER_MODEL, device=device, max_length=512)
-}
 
 def get_embedding_model():
-    return models["embedding_model"]
+    return _get("embedding_model", load_embedding_model)
 
 def get_reranker_model():
-    return models["reranker_model"]
\ No newline at end of file
+    return _get("reranker_model", load_reranker_model)
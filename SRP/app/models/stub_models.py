@@ -0,0 +1,88 @@
+# app/models/stub_models.py
+import hashlib
+import re
+import time
+from functools import lru_cache
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _tokens(text: str):
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+@lru_cache(maxsize=200000)
+def _token_hash(token: str) -> int:
+    # blake2b rather than hash(): str hashes are salted per process, and the
+    # indexer, the API and the inference workers must all agree on every vector.
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _sleep_ms(ms: float):
+    if ms > 0:
+        time.sleep(ms / 1000.0)
+
+
+class StubEmbeddingModel:
+    """
+    Deterministic stand-in for a SentenceTransformer bi-encoder.
+
+    Each text becomes a signed bag of hashed tokens, L2-normalized, so texts that
+    share words land close together and intent classification and retrieval still
+    behave sensibly. Needs no model download and costs microseconds per text, plus
+    whatever artificial latency it is configured with.
+    """
+    def __init__(self, dim: int = 384, call_latency_ms: float = 0.0, item_latency_ms: float = 0.0):
+        self.dim = dim
+        self.call_latency_ms = call_latency_ms
+        self.item_latency_ms = item_latency_ms
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in _tokens(text):
+            h = _token_hash(token)
+            vector[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar=None, **kwargs):
+        """Same call shape as SentenceTransformer.encode: a string gives a vector, a list gives a matrix."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        _sleep_ms(self.call_latency_ms + self.item_latency_ms * len(texts))
+        embeddings = np.stack([self._embed(t) for t in texts]) if texts else np.zeros((0, self.dim), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+class StubCrossEncoder:
+    """
+    Deterministic stand-in for a CrossEncoder reranker.
+
+    Scores a (query, document) pair by the share of query tokens that appear in
+    the document, mapped onto a logit-like range, with a small hash-based tie
+    breaker so rankings are total and stable.
+    """
+    def __init__(self, call_latency_ms: float = 0.0, pair_latency_ms: float = 0.0):
+        self.call_latency_ms = call_latency_ms
+        self.pair_latency_ms = pair_latency_ms
+
+    def _score(self, query: str, document: str) -> float:
+        query_tokens = set(_tokens(query))
+        if not query_tokens:
+            return -10.0
+        overlap = len(query_tokens & set(_tokens(document))) / len(query_tokens)
+        tie_breaker = (_token_hash(f"{query}\x00{document}") % 1000) / 1e6
+        return 20.0 * overlap - 10.0 + tie_breaker
+
+    def predict(self, sentences, batch_size: int = 32, show_progress_bar=None, **kwargs):
+        """Same call shape as CrossEncoder.predict: one pair gives a scalar, a list of pairs an array."""
+        single = len(sentences) > 0 and isinstance(sentences[0], str)
+        pairs = [sentences] if single else list(sentences)
+        _sleep_ms(self.call_latency_ms + self.pair_latency_ms * len(pairs))
+        scores = np.array([self._score(q, d) for q, d in pairs], dtype=np.float32)
+        return scores[0] if single else scores
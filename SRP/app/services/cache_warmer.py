@@ -0,0 +1,177 @@
+# app/services/cache_warmer.py
+import asyncio
+import csv
+import logging
+import time
+from collections import Counter
+from pathlib import Path
+
+from .inference_executor import ExecutorSaturatedError
+from .result_cache import normalize_query
+from ..core.config import (
+    WARM_QUERY_LOG_PATH, WARM_SEED_QUERIES_PATH, WARM_TOP_N, WARM_QUERIES_PER_SECOND,
+    WARM_BATCH_SIZE, WARM_POLL_SECONDS, RESULT_CACHE_TTL_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+
+def load_popular_queries(log_path: Path = WARM_QUERY_LOG_PATH, seed_path: Path = WARM_SEED_QUERIES_PATH,
+                         top_n: int = WARM_TOP_N):
+    """
+    Builds the ranked list of head queries to keep warm.
+
+    The query log is a text file with one query per line, optionally followed by a
+    tab and a count (`running shoes\\t1832`). Lines with counts are ranked by count;
+    otherwise file order is the rank. If there is no log, the queries are seeded from
+    the `generated_query` column of the Gemini-generated query CSV, ranked by how
+    often each query appears.
+
+    Returns:
+        list[str]: Up to `top_n` unique queries, most popular first.
+    """
+    if log_path and Path(log_path).is_file():
+        entries = []
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                query, _, count = line.rstrip("\n").partition("\t")
+                if query.strip():
+                    entries.append((query.strip(), int(count) if count.strip().isdigit() else 0))
+        # sorted() is stable, so without counts the file order is kept
+        ranked = [q for q, _ in sorted(entries, key=lambda e: e[1], reverse=True)]
+        source = log_path
+    elif seed_path and Path(seed_path).is_file():
+        counts = Counter()
+        with open(seed_path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                query = (row.get("generated_query") or "").strip()
+                if query:
+                    counts[query] += 1
+        ranked = [q for q, _ in counts.most_common()]
+        source = seed_path
+    else:
+        logger.warning("No query log or seed file found; cache warming has nothing to do.")
+        return []
+
+    # De-duplicate on the cache key so "Smart TV" and "smart tv" are warmed once
+    popular, seen = [], set()
+    for query in ranked:
+        key = normalize_query(query)
+        if key not in seen:
+            seen.add(key)
+            popular.append(query)
+    logger.info(f"Loaded {min(len(popular), top_n)} popular queries from '{source}'.")
+    return popular[:top_n]
+
+
+class CacheWarmer:
+    """
+    Precomputes results for popular queries so head queries never pay full pipeline cost.
+
+    Runs in the background: once after startup, again after index writes to
+    recompute just the entries they dropped, and again before warmed entries would
+    expire. Work is rate-limited to WARM_QUERIES_PER_SECOND and runs as background
+    reranker jobs, which only start while no live request is using the reranker.
+    """
+    def __init__(self, search_service, queries=None):
+        self.search_service = search_service
+        self.queries = queries if queries is not None else load_popular_queries()
+        self.warmed_version = None
+        self.last_started_at = None
+        self.last_completed_at = None
+        self.last_refreshed_at = None
+        self.last_run_queries = 0
+        self.last_run_seconds = None
+        self.running = False
+
+    async def run(self):
+        """Background loop. Cancel the task to stop it."""
+        if not self.queries:
+            return
+        while True:
+            if self._needs_warming():
+                try:
+                    # Entries getting old are recomputed wholesale; after writes only the dropped ones are
+                    await self.warm_once(refresh=self._needs_refresh())
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Cache warming run failed: {e}")
+            await asyncio.sleep(WARM_POLL_SECONDS)
+
+    def _needs_warming(self):
+        return self.warmed_version != self.search_service.index_version or self._needs_refresh()
+
+    def _needs_refresh(self):
+        # Re-warm before the entries we warmed last time start to expire
+        return (self.last_refreshed_at is not None
+                and time.monotonic() - self.last_refreshed_at > RESULT_CACHE_TTL_SECONDS / 2)
+
+    async def warm_once(self, refresh: bool = False):
+        """
+        Computes results for every popular query that isn't cached yet.
+
+        Writes that land mid-run don't restart it: they only drop the entries they
+        affect, and the next run fills those in.
+
+        Args:
+            refresh (bool): Recompute queries even if they are already cached.
+        """
+        service = self.search_service
+        version = service.index_version
+        self.running = True
+        self.last_started_at = time.time()
+        start = time.monotonic()
+        warmed = 0
+        logger.info(f"Warming result cache for {len(self.queries)} queries at index version {version}...")
+        try:
+            for i in range(0, len(self.queries), WARM_BATCH_SIZE):
+                batch = [
+                    q for q in self.queries[i:i + WARM_BATCH_SIZE]
+                    if refresh or not service.result_cache.contains(q)
+                ]
+                if batch:
+                    await self._wait_for_idle_inference()
+                    try:
+                        await service.search_batch(batch, refresh_cache=refresh, background=True)
+                        warmed += len(batch)
+                    except ExecutorSaturatedError:
+                        # Live traffic has the reranker full; back off and carry on with the next batch
+                        await asyncio.sleep(WARM_POLL_SECONDS)
+                    # Rate limit: spread the batches out so warming never looks like a load spike
+                    await asyncio.sleep(len(batch) / WARM_QUERIES_PER_SECOND)
+            self.warmed_version = version
+            self.last_completed_at = time.monotonic()
+            if refresh or self.last_refreshed_at is None:
+                self.last_refreshed_at = self.last_completed_at
+            self.last_run_queries = warmed
+            self.last_run_seconds = round(self.last_completed_at - start, 2)
+            logger.info(f"Cache warming complete: {warmed} queries computed in {self.last_run_seconds}s.")
+        finally:
+            self.running = False
+
+    async def _wait_for_idle_inference(self):
+        # Live requests always go first: only start a warming batch when the reranker is idle.
+        while self.search_service.inference.depth > 0:
+            await asyncio.sleep(0.05)
+
+    def report(self):
+        """Coverage of the popular-query list in the cache, and how fresh the warmed results are."""
+        service = self.search_service
+        version = service.index_version
+        cached = sum(1 for q in self.queries if service.result_cache.contains(q))
+        return {
+            "popular_queries": len(self.queries),
+            "cached": cached,
+            "coverage": round(cached / len(self.queries), 4) if self.queries else 0.0,
+            "index_version": version,
+            "warmed_version": self.warmed_version,
+            "stale": self.warmed_version != version,
+            "running": self.running,
+            "last_started_at": self.last_started_at,
+            "seconds_since_last_warm": (
+                round(time.monotonic() - self.last_completed_at, 1) if self.last_completed_at is not None else None
+            ),
+            "last_run_queries": self.last_run_queries,
+            "last_run_seconds": self.last_run_seconds,
+        }
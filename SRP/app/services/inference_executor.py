@@ -0,0 +1,69 @@
+# app/services/inference_executor.py
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturatedError(Exception):
+    """Raised when the inference queue is full and the job has to be shed."""
+
+
+class BoundedInferenceExecutor:
+    """
+    A thread pool for model inference with a hard cap on queued + running jobs.
+
+    Unlike `loop.run_in_executor(None, ...)`, whose queue is unbounded, this
+    executor rejects new work once `max_queue_depth` jobs are in flight, so an
+    overload turns into fast 503s instead of every request slowing down together.
+    """
+    def __init__(self, max_workers: int, max_queue_depth: int):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._depth = 0
+        self.shed_count = 0
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs currently running or waiting for a worker."""
+        return self._depth
+
+    def is_saturated(self) -> bool:
+        return self._depth >= self.max_queue_depth
+
+    def record_shed(self):
+        with self._lock:
+            self.shed_count += 1
+
+    async def run(self, fn, *args):
+        """
+        Runs `fn(*args)` on the pool and awaits the result.
+
+        Raises:
+            ExecutorSaturatedError: If the queue is already at `max_queue_depth`.
+        """
+        with self._lock:
+            if self._depth >= self.max_queue_depth:
+                self.shed_count += 1
+                raise ExecutorSaturatedError(
+                    f"Inference queue is full ({self._depth}/{self.max_queue_depth} jobs in flight)."
+                )
+            self._depth += 1
+
+        future = self._pool.submit(fn, *args)
+        # The slot is released when the job actually finishes (or is cancelled before
+        # starting), not when the caller stops waiting for it. A job abandoned because
+        # of a deadline still occupies a worker, so it must still count against the cap.
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future):
+        with self._lock:
+            self._depth -= 1
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,391 @@
+# app/services/inference_pool.py
+import asyncio
+import itertools
+import logging
+import math
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .inference_executor import ExecutorSaturatedError
+
+logger = logging.getLogger(__name__)
+
+# How long to wait for every worker to load its model before giving up
+WORKER_STARTUP_TIMEOUT_SECONDS = 300
+# Delay before replacing a crashed worker, doubled for each crash in a row up to the max,
+# so a worker that dies on startup (bad model, out of memory) doesn't spin the CPU.
+WORKER_RESPAWN_DELAY_SECONDS = 1.0
+WORKER_RESPAWN_MAX_DELAY_SECONDS = 60.0
+
+
+class RequestTooLargeError(Exception):
+    """Raised when a request needs more jobs than the pool has slots, so it could never be admitted."""
+
+
+def _worker_main(worker_id, cpu_ids, torch_threads, conn, shm_name, n_slots, slot_capacity, batch_size):
+    """
+    Entry point of one inference worker process.
+
+    The worker pins itself to its slice of cores, loads its own copy of the
+    cross-encoder and then scores jobs from `conn` until it receives `None`.
+    Scores are written straight into this worker's shared-memory buffer; only a
+    small (job_id, n, seconds, error) tuple goes back over the pipe.
+    """
+    if cpu_ids and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpu_ids)
+
+    from ..models.model_loader import limit_inference_threads, load_reranker_model
+
+    limit_inference_threads(torch_threads)
+    model = load_reranker_model(device='cpu')
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    scores_buf = np.ndarray((n_slots, slot_capacity), dtype=np.float32, buffer=shm.buf)
+    conn.send(("ready", worker_id))
+
+    try:
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                break
+            job_id, slot, pairs = msg
+            start = time.perf_counter()
+            try:
+                scores = model.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+                scores_buf[slot, :len(pairs)] = scores
+                conn.send((job_id, len(pairs), time.perf_counter() - start, None))
+            except Exception as e:
+                conn.send((job_id, 0, time.perf_counter() - start, repr(e)))
+    finally:
+        del scores_buf
+        shm.close()
+
+
+class _Worker:
+    """Parent-side handle for one worker process and its shared score buffer."""
+    def __init__(self, worker_id, n_slots, slot_capacity):
+        self.worker_id = worker_id
+        self.n_slots = n_slots
+        self.shm = shared_memory.SharedMemory(create=True, size=n_slots * slot_capacity * 4)
+        self.scores = np.ndarray((n_slots, slot_capacity), dtype=np.float32, buffer=self.shm.buf)
+        self.free_slots = list(range(n_slots))
+        self.pending = {}  # job_id -> (loop, future, slot)
+        self.outbox = queue.SimpleQueue()
+        self.conn = None
+        self.process = None
+        self.alive = False
+        self.restarts = 0
+        self.crashes_in_a_row = 0
+
+    @property
+    def inflight(self):
+        return self.n_slots - len(self.free_slots)
+
+
+class InferenceWorkerPool:
+    """
+    Runs the cross-encoder in a set of dedicated, core-pinned worker processes.
+
+    Each worker owns `slots_per_worker` slots in a shared-memory score buffer, and
+    the total number of slots is the pool's queue depth: when every slot is taken,
+    new work is shed with `ExecutorSaturatedError`, exactly like
+    `BoundedInferenceExecutor`. Requests larger than `max_pairs_per_job` are split
+    into chunks and scored by several workers in parallel.
+
+    A worker that crashes fails the jobs it was running and is replaced in the
+    background; until then its slots are out of the pool.
+
+    A request can hold every slot at once, so it is limited to `max_pairs_per_request`
+    pairs; check the largest request against that before starting the pool.
+    """
+    def __init__(self, num_workers: int, max_queue_depth: int, max_pairs_per_job: int,
+                 threads_per_worker=None, reserved_cores: int = 0,
+                 dispatch: str = "least_loaded", batch_size: int = 32):
+        if dispatch not in ("least_loaded", "round_robin"):
+            raise ValueError(f"Unknown inference dispatch policy: '{dispatch}'")
+        self.max_workers = num_workers
+        self.slots_per_worker = max(1, math.ceil(max_queue_depth / num_workers))
+        self.max_queue_depth = self.slots_per_worker * num_workers
+        self.max_pairs_per_job = max_pairs_per_job
+        self.dispatch = dispatch
+        self.batch_size = batch_size
+        self.shed_count = 0
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count()
+        self._rr = itertools.cycle(range(num_workers))
+        self._core_slices = self._plan_core_slices(num_workers, reserved_cores)
+        self._threads_per_worker = threads_per_worker
+        self._ctx = mp.get_context("spawn")  # Never fork a process that already holds torch threads
+        self._closing = False
+        self.workers = [_Worker(i, self.slots_per_worker, max_pairs_per_job) for i in range(num_workers)]
+
+    @staticmethod
+    def _plan_core_slices(num_workers, reserved_cores):
+        """Splits the cores this process may use into one contiguous slice per worker."""
+        if not hasattr(os, "sched_getaffinity"):
+            return [None] * num_workers
+        cores = sorted(os.sched_getaffinity(0))
+        usable = cores[reserved_cores:] if len(cores) - reserved_cores >= num_workers else cores
+        per_worker = max(1, len(usable) // num_workers)
+        slices = []
+        for i in range(num_workers):
+            chunk = usable[i * per_worker:(i + 1) * per_worker]
+            # More workers than cores: share cores round-robin rather than leave a worker unpinned
+            slices.append(chunk or [usable[i % len(usable)]])
+        return slices
+
+    def start(self):
+        try:
+            for worker in self.workers:
+                self._spawn(worker)
+            for worker in self.workers:
+                self._await_ready(worker)
+                self._attach(worker)
+        except BaseException:
+            # Don't leave the workers that did start running, or their shared memory behind
+            logger.error("Inference worker pool failed to start; stopping the workers already spawned.")
+            self._closing = True
+            for worker in self.workers:
+                if worker.process is not None and worker.process.is_alive():
+                    worker.process.terminate()
+                    worker.process.join(timeout=5)
+            self._release_shared_memory()
+            raise
+        logger.info(f"Inference worker pool ready: {len(self.workers)} workers, queue depth {self.max_queue_depth}.")
+
+    def _spawn(self, worker):
+        cpu_ids = self._core_slices[worker.worker_id]
+        threads = self._threads_per_worker or (len(cpu_ids) if cpu_ids else 1)
+        parent_conn, child_conn = self._ctx.Pipe()
+        worker.conn = parent_conn
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.worker_id, cpu_ids, threads, child_conn, worker.shm.name,
+                  worker.n_slots, self.max_pairs_per_job, self.batch_size),
+            name=f"inference-worker-{worker.worker_id}",
+            daemon=True,
+        )
+        worker.process.start()
+        child_conn.close()
+        logger.info(f"Started inference worker {worker.worker_id} on cores {cpu_ids} with {threads} torch threads.")
+
+    @staticmethod
+    def _await_ready(worker):
+        try:
+            if not worker.conn.poll(WORKER_STARTUP_TIMEOUT_SECONDS):
+                raise RuntimeError(f"Inference worker {worker.worker_id} did not become ready in time.")
+            worker.conn.recv()
+        except EOFError:
+            raise RuntimeError(f"Inference worker {worker.worker_id} exited during startup.") from None
+
+    def _attach(self, worker):
+        """Puts a ready worker (back) into rotation, with fresh slots and its own I/O threads."""
+        with self._lock:
+            worker.outbox = queue.SimpleQueue()
+            worker.free_slots = list(range(worker.n_slots))
+            worker.alive = True
+        threading.Thread(target=self._send_loop, args=(worker, worker.outbox), daemon=True,
+                         name=f"inference-send-{worker.worker_id}").start()
+        threading.Thread(target=self._recv_loop, args=(worker,), daemon=True,
+                         name=f"inference-recv-{worker.worker_id}").start()
+
+    # --- Admission control (same surface as BoundedInferenceExecutor) ---
+    @property
+    def depth(self) -> int:
+        return sum(w.inflight for w in self.workers)
+
+    def is_saturated(self) -> bool:
+        return not any(w.alive and w.free_slots for w in self.workers)
+
+    @property
+    def max_pairs_per_request(self) -> int:
+        """The most pairs one `predict` call can score: one job per slot."""
+        return self.max_queue_depth * self.max_pairs_per_job
+
+    @property
+    def workers_alive(self) -> int:
+        return sum(w.alive for w in self.workers)
+
+    @property
+    def worker_restarts(self) -> int:
+        return sum(w.restarts for w in self.workers)
+
+    def record_shed(self):
+        with self._lock:
+            self.shed_count += 1
+
+    # --- Dispatch ---
+    def _pick_worker(self):
+        """Returns a live worker with a free slot, or None. Caller must hold the lock."""
+        candidates = [w for w in self.workers if w.alive and w.free_slots]
+        if not candidates:
+            return None
+        if self.dispatch == "least_loaded":
+            return min(candidates, key=lambda w: w.inflight)
+        for _ in range(len(self.workers)):
+            worker = self.workers[next(self._rr)]
+            if worker.alive and worker.free_slots:
+                return worker
+        return None
+
+    async def predict(self, pairs):
+        """
+        Scores (query, doc) pairs on the worker processes.
+
+        Returns:
+            tuple[np.ndarray, float]: One score per pair, and the slowest chunk's
+            compute time in seconds (queueing excluded).
+
+        Raises:
+            RequestTooLargeError: If the request has more than `max_pairs_per_request` pairs.
+            ExecutorSaturatedError: If there are not enough free slots for the request.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = [pairs[i:i + self.max_pairs_per_job] for i in range(0, len(pairs), self.max_pairs_per_job)]
+        if len(chunks) > self.max_queue_depth:
+            # Shedding it would be wrong: it would be shed even on an idle pool
+            raise RequestTooLargeError(
+                f"{len(pairs)} pairs need {len(chunks)} jobs of up to {self.max_pairs_per_job} pairs, "
+                f"but the pool only has {self.max_queue_depth} slots."
+            )
+
+        # Reserve every slot up front so a request is either fully admitted or shed.
+        jobs = []
+        futures = []
+        with self._lock:
+            for chunk in chunks:
+                worker = self._pick_worker()
+                if worker is None:
+                    for w, slot, _, _ in jobs:
+                        w.free_slots.append(slot)
+                    self.shed_count += 1
+                    raise ExecutorSaturatedError(
+                        f"Inference workers are full: {len(chunks)} slots needed, "
+                        f"{self.depth}/{self.max_queue_depth} in use, {self.workers_alive}/{len(self.workers)} workers alive."
+                    )
+                jobs.append((worker, worker.free_slots.pop(), next(self._job_ids), chunk))
+            # Registered under the lock, so a worker that dies now either fails these jobs or was never picked
+            for worker, slot, job_id, chunk in jobs:
+                future = loop.create_future()
+                worker.pending[job_id] = (loop, future, slot)
+                worker.outbox.put((job_id, slot, chunk))
+                futures.append(future)
+
+        results = await asyncio.gather(*futures)
+        scores = np.concatenate([r[0] for r in results]) if results else np.empty(0, dtype=np.float32)
+        return scores, max((r[1] for r in results), default=0.0)
+
+    def _send_loop(self, worker, outbox):
+        # Pipe writes block once the OS buffer fills, so they happen here, never on the event loop.
+        conn = worker.conn
+        while True:
+            msg = outbox.get()
+            try:
+                conn.send(msg)
+            except (OSError, EOFError):
+                break
+            if msg is None:
+                break
+
+    def _recv_loop(self, worker):
+        while True:
+            try:
+                job_id, n, seconds, error = worker.conn.recv()
+            except (OSError, EOFError):
+                self._fail_worker(worker)
+                return
+            # Copy out before releasing the slot; the worker may overwrite it right after.
+            with self._lock:
+                loop, future, slot = worker.pending.pop(job_id)
+                scores = worker.scores[slot, :n].copy()
+                worker.free_slots.append(slot)
+                worker.crashes_in_a_row = 0
+            if error:
+                loop.call_soon_threadsafe(_set_exception, future, RuntimeError(f"Inference worker error: {error}"))
+            else:
+                loop.call_soon_threadsafe(_set_result, future, (scores, seconds))
+
+    def _fail_worker(self, worker):
+        with self._lock:
+            if not worker.alive:
+                return
+            worker.alive = False
+            pending, worker.pending = worker.pending, {}
+            worker.outbox.put(None)  # Lets the old sender thread exit
+        for loop, future, _ in pending.values():
+            loop.call_soon_threadsafe(_set_exception, future, RuntimeError("Inference worker exited."))
+        if self._closing:
+            return
+        exitcode = worker.process.exitcode if worker.process is not None else None
+        logger.error(f"Inference worker {worker.worker_id} exited (code {exitcode}); "
+                     f"failed {len(pending)} pending jobs, respawning it.")
+        threading.Thread(target=self._respawn, args=(worker,), daemon=True,
+                         name=f"inference-respawn-{worker.worker_id}").start()
+
+    def _respawn(self, worker):
+        """Replaces a crashed worker, backing off while it keeps crashing."""
+        while not self._closing:
+            delay = min(WORKER_RESPAWN_DELAY_SECONDS * 2 ** worker.crashes_in_a_row, WORKER_RESPAWN_MAX_DELAY_SECONDS)
+            worker.crashes_in_a_row += 1
+            time.sleep(delay)
+            if self._closing:
+                return
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.kill()
+            try:
+                self._spawn(worker)
+                self._await_ready(worker)
+            except Exception as e:
+                logger.error(f"Respawning inference worker {worker.worker_id} failed: {e}")
+                continue
+            if self._closing:
+                return
+            worker.restarts += 1
+            self._attach(worker)
+            logger.info(f"Inference worker {worker.worker_id} is back ({worker.restarts} restarts).")
+            return
+
+    def shutdown(self):
+        self._closing = True
+        with self._lock:
+            for worker in self.workers:
+                if worker.alive:
+                    worker.alive = False
+                    worker.outbox.put(None)
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+        self._release_shared_memory()
+
+    def _release_shared_memory(self):
+        for worker in self.workers:
+            if worker.shm is None:
+                continue  # Already released (shutdown after a failed start)
+            worker.scores = None
+            worker.shm.close()
+            try:
+                worker.shm.unlink()
+            except FileNotFoundError:
+                pass
+            worker.shm = None
+
+
+def _set_result(future, result):
+    # The caller may have stopped waiting (deadline passed); drop the late result.
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future, exc):
+    if not future.done():
+        future.set_exception(exc)
@@ -11,6 +11,11 @@ class IntentClassifier:
         logger.info("Initializing Intent Classifier...")
         self.chroma = chroma_manager
         self.collection_name = CATEGORY_COLLECTION_NAME
+        # In-memory copy of the category collection, used for batched classification.
+        # It's small (one row per search string), so a dense matrix is cheap to hold.
+        self._category_matrix = None
+        self._category_sq_norms = None
+        self._category_documents = None
 
     async def predict_categories(self, query_embedding: np.ndarray, top_k: int = 3):
         """
@@ -49,4 +54,52 @@ class IntentClassifier:
             return unique_predicted_categories
         except Exception as e:
             logger.error(f"Could not query category collection: {e}. Intent classification disabled for this query.")
-            return []
\ No newline at end of file
+            return []
+
+    async def predict_categories_batch(self, query_embeddings: np.ndarray, top_k: int = 3):
+        """
+        Predicts categories for many queries with a single matrix operation.
+
+        Uses the same rule as `predict_categories` (nearest top_k*6 search strings by
+        L2 distance, de-duplicated to top_k subcategories), but against an in-memory
+        copy of the category collection instead of one ChromaDB query per query.
+
+        Args:
+            query_embeddings (np.ndarray): A (n_queries, dim) matrix of query embeddings.
+            top_k (int): The number of top categories to return per query.
+
+        Returns:
+            list[list[str]]: Predicted category names for each query, in order.
+        """
+        try:
+            matrix, sq_norms, documents = self._load_category_matrix()
+        except Exception as e:
+            logger.error(f"Could not load category matrix: {e}. Falling back to per-query classification.")
+            return [await self.predict_categories(q, top_k=top_k) for q in query_embeddings]
+
+        if matrix.shape[0] == 0:
+            return [[] for _ in range(len(query_embeddings))]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        # Squared L2 distance (ChromaDB's default space) for every (query, search string) pair.
+        # ||q||^2 is constant per row, so it doesn't affect the ordering and is left out.
+        distances = sq_norms[None, :] - 2.0 * (queries @ matrix.T)
+
+        n_nearest = min(top_k * 6, matrix.shape[0])
+        nearest = np.argpartition(distances, n_nearest - 1, axis=1)[:, :n_nearest]
+        predictions = []
+        for row, candidates in enumerate(nearest):
+            ordered = candidates[np.argsort(distances[row, candidates])]
+            predictions.append(list(dict.fromkeys(documents[i] for i in ordered))[:top_k])
+        return predictions
+
+    def _load_category_matrix(self):
+        """Loads (or reloads, if the collection has changed size) the category embeddings."""
+        collection = self.chroma.client.get_collection(name=self.collection_name)
+        if self._category_documents is None or len(self._category_documents) != collection.count():
+            data = collection.get(include=["embeddings", "documents"])
+            self._category_matrix = np.asarray(data["embeddings"], dtype=np.float32).reshape(len(data["documents"]), -1)
+            self._category_sq_norms = np.einsum("ij,ij->i", self._category_matrix, self._category_matrix)
+            self._category_documents = data["documents"]
+            logger.info(f"Loaded {len(self._category_documents)} category embeddings for batched classification.")
+        return self._category_matrix, self._category_sq_norms, self._category_documents
@@ -0,0 +1,93 @@
+# app/services/ranking_sessions.py
+import base64
+import json
+import secrets
+import time
+from collections import OrderedDict
+
+from .result_cache import normalize_query
+
+
+class CursorMismatchError(Exception):
+    """Raised when a cursor's ranking session was started by a different query."""
+
+
+def encode_cursor(session_id: str, offset: int, limit: int) -> str:
+    """Packs a position in a stored ranking into an opaque, URL-safe token."""
+    payload = json.dumps({"s": session_id, "o": offset, "l": limit}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """
+    Returns:
+        tuple[str, int, int]: (session_id, offset, limit).
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        session_id, offset, limit = payload["s"], int(payload["o"]), int(payload["l"])
+    except Exception:
+        raise ValueError("Malformed cursor.") from None
+    if offset < 0 or limit <= 0:
+        raise ValueError("Malformed cursor.")
+    return session_id, offset, limit
+
+
+class RankingSessionStore:
+    """
+    Short-lived store of full rankings, so later pages are slices instead of new searches.
+
+    Bounded by TTL and by the total number of IDs held across all sessions; the
+    least recently used sessions are evicted first. A session pins the ranking it
+    was created with, so paging stays consistent even if the index changes meanwhile.
+    """
+    def __init__(self, max_ids: int, ttl_seconds: float):
+        self.max_ids = max_ids
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()  # session_id -> (created_at, normalized query, result)
+        self._total_ids = 0
+
+    def put(self, query: str, result: dict) -> str:
+        session_id = secrets.token_urlsafe(12)
+        self._sessions[session_id] = (time.monotonic(), normalize_query(query), result)
+        self._total_ids += len(result["ranked_ids"])
+        self._evict()
+        return session_id
+
+    def get(self, session_id: str, query: str):
+        """
+        Returns the stored result for `session_id`, or None if it has expired.
+
+        Raises:
+            CursorMismatchError: If the session belongs to a different query.
+        """
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        created_at, session_query, result = entry
+        if time.monotonic() - created_at > self.ttl_seconds:
+            self._remove(session_id)
+            return None
+        if session_query != normalize_query(query):
+            raise CursorMismatchError("Cursor does not belong to this query.")
+        self._sessions.move_to_end(session_id)
+        return result
+
+    def _remove(self, session_id):
+        _, _, result = self._sessions.pop(session_id)
+        self._total_ids -= len(result["ranked_ids"])
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._sessions:
+            oldest_id, (created_at, _, _) = next(iter(self._sessions.items()))
+            if self._total_ids <= self.max_ids and now - created_at <= self.ttl_seconds:
+                break
+            self._remove(oldest_id)
+
+    def stats(self):
+        return {"sessions": len(self._sessions), "ids": self._total_ids, "max_ids": self.max_ids}
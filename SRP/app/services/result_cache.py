@@ -0,0 +1,125 @@
+# app/services/result_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+# Tag of results retrieved from the whole catalogue (no predicted category): any write can change them
+ALL_CATEGORIES = None
+
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a query: lower-cased with whitespace collapsed."""
+    return " ".join(query.lower().split())
+
+
+class ResultCache:
+    """
+    An LRU cache of full search results with a TTL.
+
+    Each entry remembers the products it ranked and the categories its candidates
+    were retrieved from. A write to the index only drops the entries it can
+    affect: those that rank a written product (its text or score may have
+    changed) and those retrieved from a category a written product is in (it may
+    now be a candidate). Every other entry keeps being served.
+
+    `generation` counts those writes. A result is stored with the generation it
+    was computed at, and refused if a write landed in between: it may have read
+    the data from before the write, after the write's invalidation had run.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # query -> (stored_at, result, categories)
+        # Inverted indexes for invalidation: product ID / category -> queries whose entry depends on it
+        self._by_pid = {}
+        self._by_category = {}
+        # Writes come in on the API's thread pool while lookups run on the event loop
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def get(self, query: str):
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, query: str, result: dict, categories, generation: int):
+        """
+        Stores a result, unless the index was written to since `generation`.
+
+        Args:
+            categories (list[str] | None): The categories its candidates were retrieved
+                from, or None if they came from the whole catalogue.
+            generation (int): The value of `generation` when the search started.
+        """
+        key = normalize_query(query)
+        categories = tuple(categories) if categories else (ALL_CATEGORIES,)
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), result, categories)
+            for pid in result["ranked_ids"]:
+                self._by_pid.setdefault(pid, set()).add(key)
+            for category in categories:
+                self._by_category.setdefault(category, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def contains(self, query: str) -> bool:
+        """Like `get`, but without touching LRU order or hit/miss counters."""
+        entry = self._entries.get(normalize_query(query))
+        return entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds
+
+    def invalidate(self, pids, categories) -> int:
+        """
+        Drops the entries a write of `pids` (in `categories`) can change.
+        Call it once the write is done.
+
+        Returns:
+            int: The number of entries dropped.
+        """
+        with self._lock:
+            self.generation += 1
+            keys = set(self._by_category.get(ALL_CATEGORIES, ()))
+            for pid in pids:
+                keys.update(self._by_pid.get(pid, ()))
+            for category in categories:
+                keys.update(self._by_category.get(category, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidated += len(keys)
+            return len(keys)
+
+    def _remove(self, key):
+        """Removes an entry and its index references. Caller must hold the lock."""
+        _, result, categories = self._entries.pop(key)
+        for pid in result["ranked_ids"]:
+            _discard(self._by_pid, pid, key)
+        for category in categories:
+            _discard(self._by_category, category, key)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries), "max_entries": self.max_entries,
+            "hits": self.hits, "misses": self.misses, "invalidated": self.invalidated,
+        }
+
+
+def _discard(index: dict, tag, key):
+    keys = index.get(tag)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del index[tag]
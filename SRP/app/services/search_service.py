@@ -1,44 +1,317 @@
 # app/services/search_service.py
 
 from ..db.chroma_manager import ChromaManager
+from ..db.product_store import ColumnarProductStore
 from ..models.model_loader import get_embedding_model, get_reranker_model
 from .intent_classifier import IntentClassifier # Import the new class
+from .inference_executor import BoundedInferenceExecutor, ExecutorSaturatedError
+from .inference_pool import InferenceWorkerPool
+from .result_cache import ResultCache
+from .ranking_sessions import RankingSessionStore
+from .sharding import ShardedRetriever
+from ..core.profiling import span
 import logging
 import asyncio # Import asyncio
-from ..core.config import PRODUCT_COLLECTION_NAME, QUERY_CLASSIFICATION_TOP_K, CANDIDATES_PER_CATEGORY, FALLBACK_CANDIDATE_COUNT
+import time
+from functools import partial
+import numpy as np
+from typing import List, Optional
+from ..core.config import (
+    PRODUCT_COLLECTION_NAME, QUERY_CLASSIFICATION_TOP_K, CANDIDATES_PER_CATEGORY, FALLBACK_CANDIDATE_COUNT,
+    SEARCH_DEADLINE_MS, INFERENCE_EXECUTOR_WORKERS, INFERENCE_MAX_QUEUE_DEPTH,
+    INFERENCE_WORKERS, INFERENCE_THREADS_PER_WORKER, INFERENCE_RESERVED_CORES, INFERENCE_DISPATCH,
+    INFERENCE_MAX_PAIRS_PER_JOB, RERANK_BATCH_SIZE, BATCH_RERANK_MAX_PAIRS, BATCH_MAX_INFERENCE_SLOTS,
+    BATCH_SLOT_POLL_MS, WARM_MAX_INFERENCE_SLOTS, WARM_MAX_PAIRS_PER_JOB,
+    RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_SECONDS, PRODUCT_STORE_PATH, PRODUCT_STORE_FIELDS, PRODUCT_STORE_FIELD_TYPES,
+    RANKING_SESSION_MAX_IDS, RANKING_SESSION_TTL_SECONDS,
+    SRP_ROLE, SHARD_URLS, SHARD_PARTITION, SHARD_TIMEOUT_MS, SHARD_TOP_M,
+    SHARD_WRITE_TIMEOUT_SECONDS
+)
 
 
 logger = logging.getLogger(__name__)
 
+# Smoothing factor for the moving average of observed rerank cost
+RERANK_COST_EMA_ALPHA = 0.2
+
 class SearchService:
     def __init__(self, chroma_manager: ChromaManager):
         self.chroma = chroma_manager
         self.embed_model = get_embedding_model()
-        self.reranker = get_reranker_model()
+        # Shards only retrieve; reranking happens on the coordinator
+        reranks = SRP_ROLE != "shard"
+        # With dedicated inference workers the cross-encoder lives in those processes instead
+        self.reranker = get_reranker_model() if reranks and INFERENCE_WORKERS == 0 else None
         # The classifier now needs the chroma_manager
         self.intent_classifier = IntentClassifier(chroma_manager)
         self.product_collection_name = PRODUCT_COLLECTION_NAME
-    
-    async def search(self, query: str):
+        # Where the reranker runs: dedicated worker processes if configured, otherwise a
+        # bounded thread pool in this process. Both expose the same admission-control surface.
+        if reranks and INFERENCE_WORKERS > 0:
+            self.inference = InferenceWorkerPool(
+                num_workers=INFERENCE_WORKERS,
+                max_queue_depth=INFERENCE_MAX_QUEUE_DEPTH,
+                max_pairs_per_job=INFERENCE_MAX_PAIRS_PER_JOB,
+                threads_per_worker=INFERENCE_THREADS_PER_WORKER,
+                reserved_cores=INFERENCE_RESERVED_CORES,
+                dispatch=INFERENCE_DISPATCH,
+                batch_size=RERANK_BATCH_SIZE,
+            )
+            # A search's pairs go to the pool in one call; fail now if that call could never be admitted
+            largest_search = max(QUERY_CLASSIFICATION_TOP_K * CANDIDATES_PER_CATEGORY, FALLBACK_CANDIDATE_COUNT)
+            if largest_search > self.inference.max_pairs_per_request:
+                raise ValueError(
+                    f"A search can rerank up to {largest_search} pairs, but the inference pool takes at most "
+                    f"{self.inference.max_pairs_per_request} per request (INFERENCE_MAX_QUEUE_DEPTH x "
+                    f"INFERENCE_MAX_PAIRS_PER_JOB). Raise one of them or lower CANDIDATES_PER_CATEGORY."
+                )
+            self.inference.start()
+        else:
+            self.inference = BoundedInferenceExecutor(INFERENCE_EXECUTOR_WORKERS, INFERENCE_MAX_QUEUE_DEPTH)
+        # Moving average of rerank wall time per (query, doc) pair, in seconds.
+        # Used to predict whether the rerank stage can finish before the deadline.
+        self._rerank_seconds_per_pair = None
+        self.stats = {"requests": 0, "degraded": 0}
+        # Writes only drop the cached results they can change (see `index_version`)
+        self.result_cache = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_SECONDS)
+        # Full rankings behind paginated searches, so "load more" is a slice, not a new search
+        self.ranking_sessions = RankingSessionStore(RANKING_SESSION_MAX_IDS, RANKING_SESSION_TTL_SECONDS)
+        # Display fields for hydrating results in-process
+        self.product_store = ColumnarProductStore(PRODUCT_STORE_PATH, PRODUCT_STORE_FIELDS, PRODUCT_STORE_FIELD_TYPES)
+        # On a coordinator the products live on the shards: retrieval, hydration and inserts go there
+        self.shards = (
+            ShardedRetriever(SHARD_URLS, SHARD_PARTITION, SHARD_TIMEOUT_MS, SHARD_TOP_M, SHARD_WRITE_TIMEOUT_SECONDS)
+            if SRP_ROLE == "coordinator" else None
+        )
+
+    @property
+    def index_version(self) -> int:
+        """
+        Number of writes to the product index so far. A result computed while a
+        write landed isn't cached, and the cache warmer watches this to know when
+        to fill in the entries a write dropped.
+        """
+        return self.result_cache.generation
+
+    async def search(self, query: str, deadline_ms: Optional[int] = None):
+        """
+        Runs the full search pipeline within a time budget.
+
+        Args:
+            query (str): The user's search query.
+            deadline_ms (int, optional): Time budget for this request. Defaults to SEARCH_DEADLINE_MS.
+
+        Returns:
+            dict: `ranked_ids`, their `scores`, `degraded`, which is True when the
+                  reranker was skipped and the bi-encoder order was returned instead,
+                  and `partial`, which is True when some shards didn't answer.
+
+        Raises:
+            ExecutorSaturatedError: If the inference queue is full and the request is shed.
+            ShardsUnavailableError: On a coordinator, if no shard answered.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (deadline_ms or SEARCH_DEADLINE_MS) / 1000.0
+        self.stats["requests"] += 1
+
+        # Cache hits are served even when the reranker is overloaded
+        with span("cache.lookup") as s:
+            cached = self.result_cache.get(query)
+            s.set(hit=cached is not None)
+        if cached is not None:
+            return cached
+        self._admit()
+        index_version = self.index_version
+
         # Stage 1: Query Embedding
-        query_embedding = self.embed_model.encode(query)
+        with span("embed"):
+            query_embedding = self.embed_model.encode(query)
 
         # Stage 2: Intent Classification (This is fast, can remain sync)
-        predicted_cats = await self.intent_classifier.predict_categories(query_embedding, top_k=QUERY_CLASSIFICATION_TOP_K)
+        with span("intent") as s:
+            predicted_cats = await self.intent_classifier.predict_categories(query_embedding, top_k=QUERY_CLASSIFICATION_TOP_K)
+            s.set(categories=predicted_cats)
         logger.info(f"Predicted intent categories: {predicted_cats}")
 
         # Stage 2: Concurrent Candidate Retrieval
+        with span("retrieve") as s:
+            candidate_ids, candidate_docs, candidate_distances, partial = await self._retrieve_candidates(
+                query_embedding, predicted_cats
+            )
+            s.set(candidates=len(candidate_ids), partial=partial)
+        logger.info(f"Total unique candidates to rerank: {len(candidate_ids)}")
+
+        # Stage 3: Reranking, bounded by whatever is left of the time budget
+        pairs = [[query, doc] for doc in candidate_docs]
+        with span("rerank", pairs=len(pairs)) as s:
+            scores = await self._score_within_deadline(pairs, deadline)
+            s.set(skipped=scores is None)
+        with span("build_result"):
+            result = self._build_result(candidate_ids, candidate_distances, scores, partial)
+        self._cache_result(index_version, query, result, predicted_cats)
+        return result
+
+    async def search_page(self, query: str, offset: int, limit: int,
+                          session_id: Optional[str] = None, deadline_ms: Optional[int] = None):
+        """
+        Returns one page of a query's ranking.
+
+        The full ranking is computed once and, if there are more pages after this
+        one, kept in a ranking session; pages for the same session are slices of it.
+        If the session has expired, the search is run again and a new session started.
+
+        Returns:
+            dict: Like `search()`, with `ranked_ids`/`scores` cut to the page, plus
+                  `total`, `session_id` and `next_offset` (both None on the last page
+                  of a new search).
+
+        Raises:
+            CursorMismatchError: If `session_id` belongs to a different query.
+            ExecutorSaturatedError: If a new search is needed and the request is shed.
+        """
+        with span("ranking_session.lookup") as s:
+            result = self.ranking_sessions.get(session_id, query) if session_id else None
+            s.set(hit=result is not None)
+        end = offset + limit
+        if result is None:
+            result = await self.search(query, deadline_ms=deadline_ms)
+            # Nothing to page through when this page already reaches the end of the ranking
+            session_id = self.ranking_sessions.put(query, result) if end < len(result["ranked_ids"]) else None
+
+        total = len(result["ranked_ids"])
+        return {
+            "ranked_ids": result["ranked_ids"][offset:end],
+            "scores": result["scores"][offset:end],
+            "degraded": result["degraded"],
+            "partial": result["partial"],
+            "total": total,
+            "session_id": session_id,
+            "next_offset": end if end < total else None,
+        }
+
+    async def search_batch(self, queries: List[str], deadline_ms: Optional[int] = None, refresh_cache: bool = False,
+                           background: bool = False):
+        """
+        Runs many queries through the pipeline together.
+
+        Cached queries are answered from the result cache. The rest are embedded
+        in one forward pass, classified with one matrix operation, retrieved
+        concurrently, and their (query, doc) pairs are scored in large reranker
+        batches of up to BATCH_RERANK_MAX_PAIRS.
+
+        Args:
+            queries (list[str]): The search queries.
+            deadline_ms (int, optional): Time budget for the whole batch. None means no deadline.
+            refresh_cache (bool): Recompute every query instead of serving cached results.
+            background (bool): Yield the reranker to live requests (see `_score_pairs_batched`).
+
+        Returns:
+            list[dict]: One result per query, in the same order, shaped like `search()`'s.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + deadline_ms / 1000.0 if deadline_ms else None
+        self.stats["requests"] += len(queries)
+
+        results = [None if refresh_cache else self.result_cache.get(q) for q in queries]
+        misses = [i for i, r in enumerate(results) if r is None]
+        if misses:
+            self._admit()
+            index_version = self.index_version
+            computed, predicted = await self._search_batch_uncached([queries[i] for i in misses], deadline, background)
+            for i, result, categories in zip(misses, computed, predicted):
+                self._cache_result(index_version, queries[i], result, categories)
+                results[i] = result
+        return results
+
+    async def _search_batch_uncached(self, queries: List[str], deadline, background: bool = False):
+        """
+        The batched pipeline itself, for queries that missed the cache.
+
+        Returns:
+            tuple[list[dict], list]: The results, and each query's predicted categories.
+        """
+        # Stage 1: One forward pass for every query
+        with span("embed", queries=len(queries)):
+            query_embeddings = self.embed_model.encode(queries, batch_size=len(queries), show_progress_bar=False)
+
+        # Stage 2: Intent classification for every query at once
+        with span("intent", queries=len(queries)):
+            predicted = await self.intent_classifier.predict_categories_batch(query_embeddings, top_k=QUERY_CLASSIFICATION_TOP_K)
+
+        # Stage 2: Retrieval for all queries concurrently
+        with span("retrieve", queries=len(queries)):
+            candidates = await asyncio.gather(*[
+                self._retrieve_candidates(embedding, cats) for embedding, cats in zip(query_embeddings, predicted)
+            ])
+        logger.info(f"Retrieved candidates for {len(queries)} queries "
+                    f"({sum(len(c[0]) for c in candidates)} pairs to rerank).")
+
+        # Stage 3: Score pairs from consecutive queries together in large batches
+        all_scores = [None] * len(queries)
+        group, group_pairs = [], []
+        for i, (query, (_, docs, _, _)) in enumerate(zip(queries, candidates)):
+            group.append(i)
+            group_pairs.extend([query, doc] for doc in docs)
+            if len(group_pairs) >= BATCH_RERANK_MAX_PAIRS or i == len(queries) - 1:
+                with span("rerank", queries=len(group), pairs=len(group_pairs)) as s:
+                    scores = await self._score_within_deadline(group_pairs, deadline, batch=True, background=background)
+                    s.set(skipped=scores is None)
+                offset = 0
+                for j in group:
+                    n = len(candidates[j][0])
+                    all_scores[j] = scores[offset:offset + n] if scores is not None else None
+                    offset += n
+                group, group_pairs = [], []
+
+        results = [
+            self._build_result(ids, distances, scores, partial)
+            for (ids, _, distances, partial), scores in zip(candidates, all_scores)
+        ]
+        return results, predicted
+
+    def _cache_result(self, index_version, query, result, categories):
+        # Degraded and partial results are artefacts of load or a shard outage; don't keep serving
+        # them once that has passed. The cache itself refuses results that started before a write.
+        if not result["degraded"] and not result["partial"]:
+            self.result_cache.put(query, result, categories, index_version)
+
+    def _admit(self):
+        # Admission control: shed before doing any work if the reranker is already backed up.
+        if self.inference.is_saturated():
+            self.inference.record_shed()
+            raise ExecutorSaturatedError("Inference queue is full; shedding request.")
+
+    async def _retrieve_candidates(self, query_embedding, predicted_cats):
+        """
+        Fetches candidates for one query, per predicted category or from the whole catalogue.
+
+        Returns:
+            tuple: (ids, documents, distances, partial), where `partial` is True when
+                   some shards didn't answer (always False outside a coordinator).
+        """
+        partial = False
+        if self.shards is not None:
+            all_results, partial = await self.shards.retrieve(
+                query_embedding, predicted_cats, CANDIDATES_PER_CATEGORY, FALLBACK_CANDIDATE_COUNT
+            )
+        else:
+            all_results = await self._query_local(query_embedding, predicted_cats)
+        with span("merge"):
+            return (*self._merge_candidates(all_results), partial)
+
+    async def _query_local(self, query_embedding, predicted_cats, n_results: Optional[int] = None):
+        """Queries this node's products: one result set per category, or one unfiltered."""
         tasks = []
         if not predicted_cats:
             # Fallback for general search
             task = self.chroma.aquery_collection(
                 collection_name=self.product_collection_name,
                 query_embedding=query_embedding,
-                n_results=FALLBACK_CANDIDATE_COUNT
+                n_results=n_results or FALLBACK_CANDIDATE_COUNT
             )
             tasks.append(task)
         else:
-            logger.info(f"Fetching {CANDIDATES_PER_CATEGORY} candidates for each of {len(predicted_cats)} categories.")
+            logger.info(f"Fetching {n_results or CANDIDATES_PER_CATEGORY} candidates for each of {len(predicted_cats)} categories.")
             # Create a list of concurrent tasks, one for each category query
             for category in predicted_cats:
                 where_filter = {"subcategory": {"$eq": category}}
@@ -46,63 +319,234 @@ class SearchService:
                     collection_name=self.product_collection_name,
                     query_embedding=query_embedding,
                     where_filter=where_filter,
-                    n_results=CANDIDATES_PER_CATEGORY
+                    n_results=n_results or CANDIDATES_PER_CATEGORY
                 )
                 tasks.append(task)
-        
+
         # Run all tasks concurrently and wait for them all to complete
-        logger.info(f"Concurrently fetching candidates for {len(tasks)} tasks...")
-        all_results = await asyncio.gather(*tasks)
-        logger.info("All candidate fetches complete.")
+        return await asyncio.gather(*tasks)
+
+    async def retrieve_local(self, query_embedding, categories: Optional[List[str]], n_results: int):
+        """
+        Shard side of a scatter-gather search: this shard's top `n_results` per category.
 
-        # Process the results from all concurrent calls
+        Returns:
+            list[dict]: One `category`/`ids`/`documents`/`distances` set per category
+                        (a single set with category None for an unfiltered search).
+        """
+        all_results = await self._query_local(np.asarray(query_embedding, dtype=np.float32), categories, n_results)
+        return [
+            {
+                "category": category,
+                "ids": result["ids"][0] if result.get("ids") else [],
+                "documents": result["documents"][0] if result.get("documents") else [],
+                "distances": result["distances"][0] if result.get("distances") else [],
+            }
+            for category, result in zip(categories or [None], all_results)
+        ]
+
+    def _merge_candidates(self, all_results):
+        """
+        Flattens the result sets from all retrieval tasks into unique candidates.
+        A product returned by several tasks keeps its smallest distance.
+        """
         all_candidates = {}
+        distances = {}
         for result_set in all_results:
             if result_set and result_set.get('ids') and result_set['ids'][0]:
+                result_distances = result_set.get('distances')
                 for i, pid in enumerate(result_set['ids'][0]):
                     all_candidates[pid] = result_set['documents'][0][i]
+                    distance = result_distances[0][i] if result_distances else float(i)
+                    distances[pid] = min(distance, distances.get(pid, distance))
 
         candidate_ids = list(all_candidates.keys())
         candidate_docs = list(all_candidates.values())
-        logger.info(f"Total unique candidates to rerank: {len(candidate_ids)}")
+        candidate_distances = [distances[pid] for pid in candidate_ids]
+        return candidate_ids, candidate_docs, candidate_distances
 
-        # Stage 3: Reranking (This part is CPU/GPU bound, can remain sync)
-        reranker_input = {'ids': [candidate_ids], 'documents': [candidate_docs]}
-        # We can run the sync reranker in a thread to avoid blocking the event loop
-        loop = asyncio.get_running_loop()
-        sorted_ids = await loop.run_in_executor(
-            None, self._rerank_results, query, reranker_input
-        )
-        return sorted_ids
-    
-    def _rerank_results(self, query, chroma_results):
-        ids = chroma_results['ids'][0]
-        docs = chroma_results['documents'][0]
-        
-        if not ids:
+    def _build_result(self, ids, distances, scores, partial=False):
+        """
+        Orders candidates by reranker score, or by embedding distance alone
+        (the degraded ranking) when the reranker was skipped.
+        """
+        degraded = scores is None and len(ids) > 0
+        if degraded:
+            self.stats["degraded"] += 1
+            scores = [-float(d) for d in distances]
+        ranked = sorted(zip(ids, (float(s) for s in scores)), key=lambda x: x[1], reverse=True)
+        return {
+            "ranked_ids": [pid for pid, _ in ranked], "scores": [s for _, s in ranked],
+            "degraded": degraded, "partial": partial
+        }
+
+    def _estimate_rerank_seconds(self, n_pairs: int):
+        if self._rerank_seconds_per_pair is None:
+            return 0.0
+        # Jobs ahead of us in the queue delay our start by roughly one job each per worker.
+        queue_factor = 1 + self.inference.depth / self.inference.max_workers
+        return self._rerank_seconds_per_pair * n_pairs * queue_factor
+
+    async def _score_within_deadline(self, pairs, deadline, batch: bool = False, background: bool = False):
+        """
+        Scores pairs on the inference backend unless that would overrun the deadline.
+
+        Args:
+            batch (bool): Score through `_score_pairs_batched`, which waits for queue
+                          slots instead of shedding.
+            background (bool): With `batch`, score as low-priority background work.
+
+        Returns:
+            np.ndarray | None: One score per pair, or None if the rerank stage would
+            miss (or did miss) the deadline. A `deadline` of None waits indefinitely.
+        """
+        if not pairs:
             return []
-            
-        pairs = [[query, doc] for doc in docs]
-        scores = self.reranker.predict(pairs)
-        
-        id_score_pairs = sorted(zip(scores, ids), key=lambda x: x[0], reverse=True)
-        return [pair[1] for pair in id_score_pairs]
+        score = partial(self._score_pairs_batched, background=background) if batch else self._score_pairs
+        if deadline is None:
+            return await score(pairs)
+
+        loop = asyncio.get_running_loop()
+        remaining = deadline - loop.time()
+        if remaining <= 0 or self._estimate_rerank_seconds(len(pairs)) > remaining:
+            logger.warning(f"Skipping rerank of {len(pairs)} pairs: {remaining * 1000:.0f}ms left in budget.")
+            return None
+
+        started = loop.time()
+        try:
+            return await asyncio.wait_for(score(pairs), timeout=remaining)
+        except asyncio.TimeoutError:
+            logger.warning(f"Rerank of {len(pairs)} pairs missed the deadline; returning bi-encoder order.")
+            # The abandoned job keeps running and its real cost is never reported, but it took at
+            # least this long. Feeding that in keeps the estimate from staying optimistic under
+            # sustained overload, so later requests skip the rerank up front instead of timing out too.
+            self._record_rerank_cost(loop.time() - started, len(pairs))
+            return None
+
+    async def _score_pairs(self, pairs):
+        """Scores (query, doc) pairs with the cross-encoder, wherever it is running."""
+        with span("rerank.inference", pairs=len(pairs)) as s:
+            start = time.perf_counter()
+            if isinstance(self.inference, InferenceWorkerPool):
+                scores, seconds = await self.inference.predict(pairs)
+            else:
+                scores, seconds = await self.inference.run(self._timed_predict, pairs)
+            # Whatever isn't model compute was spent queued for a worker (or on IPC)
+            s.set(compute_ms=round(seconds * 1000, 3), queued_ms=round((time.perf_counter() - start - seconds) * 1000, 3))
+        self._record_rerank_cost(seconds, len(pairs))
+        return scores
+
+    async def _score_pairs_batched(self, pairs, background: bool = False):
+        """
+        Scores a batch search's pairs as jobs of up to INFERENCE_MAX_PAIRS_PER_JOB pairs,
+        holding at most BATCH_MAX_INFERENCE_SLOTS queue slots at a time.
+
+        The batch was admitted up front, so when the queue is full its jobs wait for a
+        free slot rather than shedding the whole batch halfway through.
+
+        A `background` batch (cache warming) runs as smaller jobs, WARM_MAX_PAIRS_PER_JOB
+        pairs and WARM_MAX_INFERENCE_SLOTS at a time, and only starts a job while the
+        queue is empty, so live requests wait for at most the jobs already running.
+        """
+        job_size = WARM_MAX_PAIRS_PER_JOB if background else INFERENCE_MAX_PAIRS_PER_JOB
+        chunks = [pairs[i:i + job_size] for i in range(0, len(pairs), job_size)]
+        slots = asyncio.Semaphore(WARM_MAX_INFERENCE_SLOTS if background else BATCH_MAX_INFERENCE_SLOTS)
+
+        async def score_chunk(chunk):
+            async with slots:
+                while True:
+                    if (self.inference.depth == 0) if background else not self.inference.is_saturated():
+                        try:
+                            return await self._score_pairs(chunk)
+                        except ExecutorSaturatedError:
+                            pass  # Another request took the last slot first
+                    await asyncio.sleep(BATCH_SLOT_POLL_MS / 1000.0)
+
+        return np.concatenate(await asyncio.gather(*[score_chunk(c) for c in chunks]))
+
+    def _timed_predict(self, pairs):
+        start = time.perf_counter()
+        scores = self.reranker.predict(pairs, batch_size=RERANK_BATCH_SIZE, show_progress_bar=False)
+        return scores, time.perf_counter() - start
+
+    def _record_rerank_cost(self, seconds, n_pairs):
+        per_pair = seconds / max(n_pairs, 1)
+        if self._rerank_seconds_per_pair is None:
+            self._rerank_seconds_per_pair = per_pair
+        else:
+            self._rerank_seconds_per_pair += RERANK_COST_EMA_ALPHA * (per_pair - self._rerank_seconds_per_pair)
+
+    async def hydrate(self, ranked_ids: List[str], fields: List[str]):
+        """
+        Attaches the requested product fields to each ranked ID, keeping the order.
+        Products missing from the product store come back with the fields set to None.
+        """
+        if self.shards is not None:
+            rows = await self.shards.fetch_products(ranked_ids, fields)
+        else:
+            rows = self.product_store.get_many(ranked_ids, fields)
+        return [{"id": pid, **(row if row is not None else dict.fromkeys(fields))} for pid, row in zip(ranked_ids, rows)]
+
+    def get_stats(self):
+        """Counters for degraded and shed requests, plus the current inference load."""
+        pool = self.inference if isinstance(self.inference, InferenceWorkerPool) else None
+        return {
+            "requests": self.stats["requests"],
+            "degraded": self.stats["degraded"],
+            "shed": self.inference.shed_count,
+            "inference_queue_depth": self.inference.depth,
+            "inference_max_queue_depth": self.inference.max_queue_depth,
+            "inference_workers_alive": pool.workers_alive if pool else None,
+            "inference_worker_restarts": pool.worker_restarts if pool else None,
+            "rerank_ms_per_pair": (
+                round(self._rerank_seconds_per_pair * 1000, 3) if self._rerank_seconds_per_pair is not None else None
+            ),
+            "cache": self.result_cache.stats(),
+            "ranking_sessions": self.ranking_sessions.stats(),
+            "shards": dict(self.shards.stats) if self.shards is not None else None,
+        }
+
+    def shutdown(self):
+        """Stops the inference backend (and its worker processes, if any)."""
+        self.inference.shutdown()
 
     def insert_products(self, products: list[dict]):
-        # products is a list of dicts, each with 'id', 'document', 'metadata'
+        # products is a list of dicts, each with 'id', 'document', 'metadata' and optional 'attributes'
+        if self.shards is not None:
+            # The owning shards embed and store them; the coordinator only has to invalidate its cache.
+            # Even when a shard fails: the ones before it may already have taken the products.
+            try:
+                self.shards.forward_products(products)
+            finally:
+                self._invalidate_cached_results(products)
+            return
         ids = [p['id'] for p in products]
         docs = [p['document'] for p in products]
         metadatas = [p['metadata'] for p in products]
 
         # Generate embeddings in a batch
         embeddings = self.embed_model.encode(docs, show_progress_bar=True)
-        
+
         # Add to DB
         self.chroma.add_items_to_collection(
             collection_name=self.product_collection_name,
             ids=ids,
             documents=docs, # Storing the combined_text as the document
-            embeddings=embeddings.tolist(),
+            embeddings=embeddings,
             metadatas=metadatas
         )
-        logger.info("Products added successfully.")
\ No newline at end of file
+        # Keep the product store current for hydration. Products sent without
+        # attributes keep whatever display fields the store already has.
+        self.product_store.upsert([
+            {**p['attributes'], 'pid': p['id'], 'subcategory': p['metadata'].get('subcategory')}
+            for p in products if p.get('attributes')
+        ])
+        self._invalidate_cached_results(products)
+        logger.info(f"Products added successfully. Index version is now {self.index_version}.")
+
+    def _invalidate_cached_results(self, products: list[dict]):
+        # Only after the write: a search that read the old data and caches after this point is refused
+        dropped = self.result_cache.invalidate(
+            [p['id'] for p in products], {p['metadata'].get('subcategory') for p in products}
+        )
+        logger.info(f"Dropped {dropped} cached results affected by {len(products)} written products.")
@@ -0,0 +1,190 @@
+# app/services/sharding.py
+import asyncio
+import logging
+import zlib
+from typing import Dict, List, Optional
+
+import httpx
+
+from ..core.profiling import span
+
+logger = logging.getLogger(__name__)
+
+
+class ShardsUnavailableError(Exception):
+    """Raised when no shard answered a retrieval request in time."""
+
+
+def _crc(value: str) -> int:
+    # crc32 rather than hash(): str hashes are salted per process, and the indexers,
+    # the shards and the coordinator must all agree on where a product lives.
+    return zlib.crc32(str(value).encode("utf-8"))
+
+
+def shard_for_product(pid: str, subcategory: Optional[str], shard_count: int, partition: str) -> int:
+    """The shard that owns a product."""
+    if partition == "subcategory":
+        return _crc(subcategory or "") % shard_count
+    if partition == "hash":
+        return _crc(pid) % shard_count
+    raise ValueError(f"Unknown shard partition: '{partition}'")
+
+
+class ShardedRetriever:
+    """
+    Coordinator-side client for a set of shard processes.
+
+    Fans one query's retrieval out to the shards concurrently, each with its own
+    timeout, and merges their local top-M candidates per category into the global
+    top-N a single node would have returned. Shards that fail or time out are left
+    out; the caller is told the candidates are partial.
+
+    Args:
+        timeout_ms (int): Wall-clock budget for each shard's answer to a read.
+        write_timeout_seconds (float): Budget for each shard to accept forwarded products.
+        client (httpx.AsyncClient, optional): Client for reads, e.g. one with a mock transport.
+    """
+    def __init__(self, urls: List[str], partition: str, timeout_ms: int, top_m: Optional[int] = None,
+                 write_timeout_seconds: float = 30.0, client: Optional[httpx.AsyncClient] = None):
+        if not urls:
+            raise ValueError("A coordinator needs at least one shard URL (SRP_SHARD_URLS).")
+        self.urls = urls
+        self.partition = partition
+        self.timeout_seconds = timeout_ms / 1000.0
+        self.write_timeout_seconds = write_timeout_seconds
+        self.top_m = top_m
+        self._client = client or httpx.AsyncClient(timeout=self.timeout_seconds)
+        self.stats = {"shard_requests": 0, "shard_failures": 0, "partial_searches": 0}
+
+    @property
+    def count(self):
+        return len(self.urls)
+
+    def _targets(self, categories: Optional[List[str]]) -> Dict[int, Optional[List[str]]]:
+        """Shard ID -> the categories to ask it for (None for an unfiltered search)."""
+        if not categories:
+            return {i: None for i in range(self.count)}
+        if self.partition == "subcategory":
+            # Each category lives on exactly one shard, so only its owner is asked
+            targets = {}
+            for category in categories:
+                targets.setdefault(shard_for_product("", category, self.count, self.partition), []).append(category)
+            return targets
+        return {i: list(categories) for i in range(self.count)}
+
+    async def retrieve(self, query_embedding, categories: Optional[List[str]], n_per_category: int, n_fallback: int):
+        """
+        Retrieves candidates from the shards.
+
+        Returns:
+            tuple[list[dict], bool]: Chroma-shaped result sets (one per category, or one
+            for an unfiltered search), and whether any shard was missing from them.
+
+        Raises:
+            ShardsUnavailableError: If none of the shards answered.
+        """
+        n_results = n_per_category if categories else n_fallback
+        targets = self._targets(categories)
+        embedding = [float(x) for x in query_embedding]
+        responses = await asyncio.gather(*[
+            self._retrieve_from(shard_id, embedding, shard_categories, self.top_m or n_results)
+            for shard_id, shard_categories in targets.items()
+        ])
+        answered = [r for r in responses if r is not None]
+        if not answered:
+            raise ShardsUnavailableError(f"None of the {len(targets)} shards answered in time.")
+        partial = len(answered) < len(targets)
+        if partial:
+            self.stats["partial_searches"] += 1
+
+        # Group every shard's result sets by category, then keep the global top n per category
+        grouped = {}
+        for result_sets in answered:
+            for result_set in result_sets:
+                group = grouped.setdefault(result_set["category"], [])
+                group.extend(zip(result_set["distances"], result_set["ids"], result_set["documents"]))
+        merged = []
+        for group in grouped.values():
+            best = sorted(group, key=lambda c: c[0])[:n_results]
+            merged.append({
+                "ids": [[pid for _, pid, _ in best]],
+                "documents": [[doc for _, _, doc in best]],
+                "distances": [[distance for distance, _, _ in best]],
+            })
+        return merged, partial
+
+    async def _retrieve_from(self, shard_id: int, embedding, categories, n_results: int):
+        url = f"{self.urls[shard_id]}/api/shard/retrieve"
+        self.stats["shard_requests"] += 1
+        with span("shard.retrieve", shard=shard_id) as s:
+            try:
+                response = await self._post(
+                    url, {"embedding": embedding, "categories": categories, "n_results": n_results}
+                )
+                return response.json()["results"]
+            except Exception as e:
+                self.stats["shard_failures"] += 1
+                s.set(failed=type(e).__name__)
+                logger.warning(f"Shard {shard_id} ({url}) failed during retrieval: {type(e).__name__}: {e}")
+                return None
+
+    async def _post(self, url: str, payload: dict) -> httpx.Response:
+        # The client's timeout applies to each connect/read/write separately; this bounds the whole exchange
+        response = await asyncio.wait_for(self._client.post(url, json=payload), self.timeout_seconds)
+        response.raise_for_status()
+        return response
+
+    async def fetch_products(self, pids: List[str], fields: List[str]):
+        """
+        Looks up display fields on the shards that own `pids`, preserving order.
+        Products whose shard is unavailable come back as None.
+        """
+        if self.partition == "hash":
+            by_shard = {}
+            for pid in pids:
+                by_shard.setdefault(shard_for_product(pid, None, self.count, self.partition), []).append(pid)
+        else:
+            # The owner depends on the subcategory, which we don't have here: ask every shard
+            by_shard = {i: pids for i in range(self.count)}
+
+        async def fetch(shard_id, shard_pids):
+            try:
+                response = await self._post(
+                    f"{self.urls[shard_id]}/api/shard/products", {"ids": shard_pids, "fields": fields}
+                )
+                return zip(shard_pids, response.json()["results"])
+            except Exception as e:
+                logger.warning(f"Shard {shard_id} failed during hydration: {type(e).__name__}: {e}")
+                return []
+
+        rows = {}
+        for pairs in await asyncio.gather(*[fetch(i, p) for i, p in by_shard.items()]):
+            for pid, row in pairs:
+                if row is not None:
+                    rows[pid] = row
+        return [rows.get(pid) for pid in pids]
+
+    def forward_products(self, products: List[dict]):
+        """
+        Sends new or updated products to the shards that own them.
+
+        Not atomic across shards: if one shard fails, the shards before it keep the
+        products they accepted. With the "subcategory" partition, a product whose
+        subcategory changed is written to its new owner only; the old shard keeps
+        its previous copy until the shards are rebuilt with the bulk indexer.
+
+        Raises:
+            httpx.HTTPError: If a shard rejected the products or didn't accept them in time.
+        """
+        by_shard = {}
+        for p in products:
+            shard_id = shard_for_product(p["id"], p["metadata"].get("subcategory"), self.count, self.partition)
+            by_shard.setdefault(shard_id, []).append(p)
+        with httpx.Client(timeout=self.write_timeout_seconds) as client:
+            for shard_id, shard_products in by_shard.items():
+                response = client.post(f"{self.urls[shard_id]}/api/products", json=shard_products)
+                response.raise_for_status()
+        logger.info(f"Forwarded {len(products)} products to {len(by_shard)} shards.")
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -6,7 +6,7 @@ from pathlib import Path
 # Add project root to path to import from app and other scripts
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-from app.core.config import PRODUCT_DATA_PATH, API_BASE_URL
+from app.core.config import PRODUCT_DATA_PATH, API_BASE_URL, PRODUCT_STORE_FIELDS
 # from scripts.utils import append_product_to_csv # Optional: if you want to use the helper
 
 API_URL = f"{API_BASE_URL}/api/products"
@@ -41,6 +41,13 @@ def prepare_product_for_api(product_dict: dict):
     subcategory = str(product_dict.get('subcategory', '')).strip()
 
     combined_text = f"{product_name}. {brand}. {description}"
+
+    # Display fields for the API's product store, so search results can be hydrated.
+    # NaN (pandas' empty cell) isn't valid JSON, so it's sent as null.
+    attributes = {
+        field: (None if pd.isna(product_dict.get(field)) else str(product_dict.get(field)))
+        for field in PRODUCT_STORE_FIELDS
+    }
     
     # Structure the payload to match the Pydantic model in the API
     api_payload = {
@@ -49,7 +56,8 @@ def prepare_product_for_api(product_dict: dict):
         "metadata": {
             "subcategory": subcategory
             # You can add more metadata here if your service uses it
-        }
+        },
+        "attributes": attributes
     }
     return api_payload
 
@@ -8,9 +8,12 @@ sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 from app.models.model_loader import get_embedding_model
 from app.db.chroma_manager import ChromaManager
+from app.db.product_store import ColumnarProductStore
+from app.services.sharding import shard_for_product
 from app.core.config import (
     PRODUCT_DATA_PATH, CATEGORY_DATA_PATH,
-    PRODUCT_COLLECTION_NAME, CATEGORY_COLLECTION_NAME, BATCH_SIZE
+    PRODUCT_COLLECTION_NAME, CATEGORY_COLLECTION_NAME, BATCH_SIZE,
+    PRODUCT_STORE_PATH, PRODUCT_STORE_FIELDS, PRODUCT_STORE_FIELD_TYPES, SRP_ROLE, SHARD_ID, SHARD_COUNT, SHARD_PARTITION
 )
 
 def clean_product_data(df: pd.DataFrame) -> pd.DataFrame:
@@ -24,10 +27,22 @@ def clean_product_data(df: pd.DataFrame) -> pd.DataFrame:
     )
     return df
 
+def select_shard_partition(df: pd.DataFrame) -> pd.DataFrame:
+    """Keeps only the products this shard owns."""
+    owners = [
+        shard_for_product(pid, subcategory, SHARD_COUNT, SHARD_PARTITION)
+        for pid, subcategory in zip(df['pid'], df['subcategory'])
+    ]
+    df = df[[owner == SHARD_ID for owner in owners]]
+    print(f"Shard {SHARD_ID}/{SHARD_COUNT} ({SHARD_PARTITION} partition) owns {len(df)} products.")
+    return df
+
 def index_products(chroma_manager, embed_model):
     print("\n--- Starting Product Indexing ---")
     df = pd.read_csv(PRODUCT_DATA_PATH)
     df_cleaned = clean_product_data(df)
+    if SRP_ROLE == "shard":
+        df_cleaned = select_shard_partition(df_cleaned)
     
     print(f"Processing {len(df_cleaned)} products in batches of {BATCH_SIZE}...")
     
@@ -48,11 +63,23 @@ def index_products(chroma_manager, embed_model):
             collection_name=PRODUCT_COLLECTION_NAME,
             ids=ids,
             documents=documents,
-            embeddings=embeddings.tolist(),
+            embeddings=embeddings,
             metadatas=metadatas
         )
     print(f"Product indexing for collection '{PRODUCT_COLLECTION_NAME}' complete.")
 
+    build_product_store(df_cleaned)
+
+def build_product_store(df: pd.DataFrame):
+    """Writes the columnar product store the API uses to hydrate search results."""
+    print("\n--- Building Product Store ---")
+    columns = {
+        field: (df[field].tolist() if field in df.columns else [None] * len(df))
+        for field in PRODUCT_STORE_FIELDS
+    }
+    store = ColumnarProductStore.build(PRODUCT_STORE_PATH, df["pid"].tolist(), columns, PRODUCT_STORE_FIELD_TYPES)
+    print(f"Product store with {len(store)} products written to '{PRODUCT_STORE_PATH}'.")
+
 def index_categories(chroma_manager, embed_model):
     print("\n--- Starting Category Indexing ---")
     df = pd.read_csv(CATEGORY_DATA_PATH)
@@ -93,7 +120,7 @@ def index_categories(chroma_manager, embed_model):
             # We store the simple subcategory name as the "document" for easy viewing,
             # but the embedding is based on the richer search_string.
             documents=stored_documents,
-            embeddings=embeddings.tolist()
+            embeddings=embeddings
         )
     print(f"Category indexing for collection '{CATEGORY_COLLECTION_NAME}' complete.")
 
@@ -102,8 +129,12 @@ def main():
     embed_model = get_embedding_model()
     chroma_manager = ChromaManager()
 
-    index_products(chroma_manager, embed_model)
-    index_categories(chroma_manager, embed_model)
+    # In a sharded deployment each shard holds a slice of the products, and only
+    # the coordinator needs the categories (it does the intent classification).
+    if SRP_ROLE != "coordinator":
+        index_products(chroma_manager, embed_model)
+    if SRP_ROLE != "shard":
+        index_categories(chroma_manager, embed_model)
 
     print("\n--- Bulk Indexing Complete for all collections! ---")
 
@@ -0,0 +1,339 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+# Add project root to path to import from app and other scripts
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import (
+    PRODUCT_DATA_PATH, API_BASE_URL, INCREMENTAL_INDEXER_STATE_PATH, INCREMENTAL_POLL_SECONDS,
+    INCREMENTAL_BATCH_SIZE, INCREMENTAL_MAX_RETRIES, INCREMENTAL_REQUEST_TIMEOUT_SECONDS,
+    INCREMENTAL_STALLED_POLLS, INCREMENTAL_MAX_RECORD_BYTES
+)
+from scripts.add_new_product import prepare_product_for_api
+
+API_URL = f"{API_BASE_URL}/api/products"
+
+# Rows missing any of these are skipped, same as in the bulk indexer
+REQUIRED_FIELDS = ("pid", "product_name", "description")
+
+# Bytes read per poll. A batch is cut short at this size; the rest is read on the next pass.
+READ_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def complete_records_end(data: bytes, max_records: int):
+    """
+    Finds where the last complete CSV record in `data` ends.
+
+    A newline only ends a record when it's outside a quoted field, i.e. when the
+    number of quote characters before it is even ("" escapes keep the parity).
+    Whatever follows the last such newline is a row still being written.
+
+    Returns:
+        tuple[int, int]: (byte length of the complete records, number of records),
+                         stopping after `max_records`.
+    """
+    end, n_records, pos, in_quotes = 0, 0, 0, False
+    while n_records < max_records:
+        newline = data.find(b"\n", pos)
+        if newline == -1:
+            break
+        if data.count(b'"', pos, newline) % 2:
+            in_quotes = not in_quotes
+        pos = newline + 1
+        if not in_quotes:
+            end = pos
+            n_records += 1
+    return end, n_records
+
+
+def _starts_records(data: bytes, fieldnames, n_check: int = 3) -> bool:
+    """Whether `data` looks like it starts at a record boundary: its first complete records have the right width."""
+    end, n_records = complete_records_end(data, n_check)
+    if n_records == 0:
+        return False
+    values = list(csv.reader(io.StringIO(data[:end].decode("utf-8", errors="replace"), newline="")))
+    return all(len(v) == len(fieldnames) for v in values if v)
+
+
+def parse_records(data: bytes, fieldnames):
+    """Parses complete CSV records into dicts. Empty cells become None, like pandas' NaN."""
+    rows = []
+    for values in csv.reader(io.StringIO(data.decode("utf-8", errors="replace"), newline="")):
+        if not values:
+            continue
+        if len(values) != len(fieldnames):
+            print(f"Warning: skipping malformed row with {len(values)} columns (expected {len(fieldnames)}): {values[:1]}")
+            continue
+        rows.append({name: (value if value != "" else None) for name, value in zip(fieldnames, values)})
+    return rows
+
+
+class ProductCsvFollower:
+    """
+    Reads the product CSV like `tail -F`, one batch of complete rows at a time.
+
+    The read position is a byte offset into the file, saved together with the
+    file's identity (device, inode) so a restart resumes exactly where the last
+    run stopped. If the file is replaced (rotation) the old file is drained first
+    and the new one is read from its first row; if it shrinks (truncation) it is
+    read again from its first row.
+    """
+    def __init__(self, path: Path, state_path: Path):
+        self.path = Path(path)
+        self.state_path = Path(state_path)
+        self.file = None
+        self.identity = None
+        self.fieldnames = None
+        self.header_end = 0
+        self.offset = 0
+        # (offset, file size) of the last poll that found only an incomplete tail, and how many polls in a row did
+        self._stalled_at = None
+        self._stalled_polls = 0
+
+    # --- Opening and state ---
+    def _open(self) -> bool:
+        """Opens the CSV and reads its header. False if there is no file or no complete header yet."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return False
+        head = f.read(READ_CHUNK_BYTES)
+        header_end, n_records = complete_records_end(head, 1)
+        if n_records == 0:
+            f.close()
+            return False
+        if self.file is not None:
+            self.file.close()
+        st = os.fstat(f.fileno())
+        self.file = f
+        self.identity = [st.st_dev, st.st_ino]
+        self.fieldnames = next(csv.reader(io.StringIO(head[:header_end].decode("utf-8-sig"), newline="")))
+        self.header_end = header_end
+        return True
+
+    def _end_of_complete_records(self) -> int:
+        """
+        Byte offset just past the last complete row currently in the file.
+
+        Only reads the end of the file. Quote parity can't be known mid-file, so the
+        scan starts at the first newline after which the rows have the header's width,
+        widening the window if none does. A window reaching back to the header is exact.
+        """
+        size = os.fstat(self.file.fileno()).st_size
+        window = READ_CHUNK_BYTES
+        while True:
+            start = max(self.header_end, size - window)
+            self.file.seek(start)
+            data = self.file.read(size - start)
+            if start == self.header_end:
+                end, _ = complete_records_end(data, len(data) + 1)
+                return start + end
+            newline = data.find(b"\n")
+            while newline != -1:
+                if _starts_records(data[newline + 1:], self.fieldnames):
+                    end, _ = complete_records_end(data[newline + 1:], len(data) + 1)
+                    return start + newline + 1 + end
+                newline = data.find(b"\n", newline + 1)
+            window *= 2
+
+    def start(self, from_beginning: bool = False) -> bool:
+        """
+        Positions the reader: at the saved offset if the state matches this file,
+        otherwise at the first row (--from-beginning, or after a rotation while we
+        were stopped), otherwise at the end of the file, on the assumption that the
+        bulk indexer has already indexed the existing rows.
+        """
+        if not self._open():
+            return False
+        state = self._load_state()
+        size = os.fstat(self.file.fileno()).st_size
+        if state and state["identity"] == self.identity and self.header_end <= state["offset"] <= size:
+            self.offset = state["offset"]
+            print(f"Resuming '{self.path}' at byte {self.offset}.")
+        elif state:
+            self.offset = self.header_end
+            print(f"'{self.path}' was rotated or truncated since the last run; indexing it from the first row.")
+        elif from_beginning:
+            self.offset = self.header_end
+            print(f"Indexing '{self.path}' from the first row.")
+        else:
+            self.offset = self._end_of_complete_records()
+            print(f"No saved position; following '{self.path}' from its current end (byte {self.offset}).")
+        self.save_state()
+        return True
+
+    def _load_state(self):
+        if not self.state_path.exists():
+            return None
+        state = json.loads(self.state_path.read_text())
+        return state if state.get("path") == str(self.path) else None
+
+    def save_state(self):
+        state = {"path": str(self.path), "identity": self.identity, "offset": self.offset, "updated_at": time.time()}
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        tmp.write_text(json.dumps(state))
+        tmp.replace(self.state_path)
+
+    # --- Reading ---
+    def read_batch(self, max_records: int):
+        """
+        Reads up to `max_records` complete rows past the current offset.
+
+        Returns:
+            tuple[list[dict], int]: The rows, and the offset to commit once they are indexed.
+        """
+        self.file.seek(self.offset)
+        data = self.file.read(READ_CHUNK_BYTES)
+        end, _ = complete_records_end(data, max_records)
+        while end == 0 and len(data) <= INCREMENTAL_MAX_RECORD_BYTES:
+            # Either nothing new, or a single row bigger than the read size: read on until it's complete
+            more = self.file.read(READ_CHUNK_BYTES)
+            if not more:
+                break
+            data += more
+            end, _ = complete_records_end(data, max_records)
+        if end == 0 and b"\n" in data and self._tail_is_stuck(data):
+            skip = data.index(b"\n") + 1
+            print(f"Warning: skipping {skip} bytes at byte {self.offset} of '{self.path}' that never formed a "
+                  f"complete row (unbalanced quote?): {data[:min(skip, 200)]!r}")
+            self._stalled_at = None
+            return [], self.offset + skip
+        if end:
+            self._stalled_at = None
+        return parse_records(data[:end], self.fieldnames), self.offset + end
+
+    def _tail_is_stuck(self, data: bytes) -> bool:
+        """
+        Called when the bytes past the offset span a newline but don't form a complete
+        record. True if they never will: the lines after the first one are complete rows
+        on their own, the tail has stayed the same for INCREMENTAL_STALLED_POLLS polls,
+        or it has grown past INCREMENTAL_MAX_RECORD_BYTES.
+        """
+        if len(data) > INCREMENTAL_MAX_RECORD_BYTES:
+            return True
+        if _starts_records(data[data.index(b"\n") + 1:], self.fieldnames):
+            return True
+        stalled_at = (self.offset, os.fstat(self.file.fileno()).st_size)
+        self._stalled_polls = self._stalled_polls + 1 if stalled_at == self._stalled_at else 1
+        self._stalled_at = stalled_at
+        return self._stalled_polls >= INCREMENTAL_STALLED_POLLS
+
+    def commit(self, offset: int):
+        self.offset = offset
+        self.save_state()
+
+    def check_rotation(self) -> bool:
+        """
+        Called once the current file has no new rows. Switches to a replaced or
+        truncated file and returns True, so the caller reads again.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False  # Mid-rotation; the new file isn't there yet
+        if [st.st_dev, st.st_ino] != self.identity:
+            print(f"'{self.path}' was rotated; following the new file from its first row.")
+        elif st.st_size < self.offset:
+            print(f"'{self.path}' was truncated; indexing it again from the first row.")
+        else:
+            return False
+        if not self._open():
+            return False
+        self.commit(self.header_end)
+        return True
+
+
+def rows_to_payloads(rows):
+    """Cleans rows the way the bulk indexer does and builds API payloads. The last row for a PID wins."""
+    payloads = {}
+    for row in rows:
+        if any(not row.get(field) for field in REQUIRED_FIELDS):
+            continue
+        row["brand"] = row.get("brand") or "Unknown"
+        payloads[row["pid"]] = prepare_product_for_api(row)
+    return list(payloads.values())
+
+
+def post_products(session: requests.Session, payloads) -> bool:
+    """
+    Sends one batch to the API, retrying transient failures with exponential backoff.
+
+    Returns:
+        bool: True once the batch is indexed, False if it was rejected as invalid (4xx),
+              in which case retrying can't help and the batch is skipped.
+
+    Raises:
+        requests.exceptions.RequestException: If the API is still failing after all retries.
+    """
+    for attempt in range(INCREMENTAL_MAX_RETRIES):
+        try:
+            response = session.post(API_URL, json=payloads, timeout=INCREMENTAL_REQUEST_TIMEOUT_SECONDS)
+            if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                print(f"Error: API rejected batch ({response.status_code}): {response.text[:500]}")
+                return False
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            if attempt == INCREMENTAL_MAX_RETRIES - 1:
+                raise
+            delay = min(2 ** attempt, 30)
+            print(f"API request failed ({e}); retrying in {delay}s...")
+            time.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index products as they are appended to the product CSV.")
+    parser.add_argument("--csv", type=Path, default=PRODUCT_DATA_PATH, help="Product CSV to follow.")
+    parser.add_argument("--state", type=Path, default=INCREMENTAL_INDEXER_STATE_PATH, help="Where to keep the read position.")
+    parser.add_argument("--from-beginning", action="store_true", help="Without saved state, index the whole file first.")
+    parser.add_argument("--once", action="store_true", help="Index what's there now and exit instead of following.")
+    parser.add_argument("--batch-size", type=int, default=INCREMENTAL_BATCH_SIZE)
+    args = parser.parse_args()
+
+    follower = ProductCsvFollower(args.csv, args.state)
+    while not follower.start(from_beginning=args.from_beginning):
+        if args.once:
+            print(f"'{args.csv}' doesn't exist or has no header yet; nothing to do.")
+            return
+        time.sleep(INCREMENTAL_POLL_SECONDS)
+
+    session = requests.Session()
+    print(f"Following '{args.csv}' and sending new products to {API_URL} in batches of up to {args.batch_size}.")
+    while True:
+        rows, end = follower.read_batch(args.batch_size)
+        if rows or end > follower.offset:
+            payloads = rows_to_payloads(rows)
+            try:
+                if payloads and post_products(session, payloads):
+                    print(f"Indexed {len(payloads)} products (through byte {end}).")
+            except requests.exceptions.RequestException as e:
+                # Not committed, so the same rows are retried on the next pass (or the next run)
+                if args.once:
+                    print(f"API unavailable ({e}); exiting. The next run resumes from byte {follower.offset}.")
+                    sys.exit(1)
+                print(f"API still unavailable ({e}); will retry.")
+                time.sleep(INCREMENTAL_POLL_SECONDS)
+                continue
+            follower.commit(end)
+            continue
+        if follower.check_rotation():
+            continue
+        if args.once:
+            break
+        time.sleep(INCREMENTAL_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nStopped. The read position is saved; the next run resumes from it.")
@@ -0,0 +1,14 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# app.core.config reads the environment at import, so this has to run before any `app` import:
+# stub models (no downloads) and a throwaway index instead of db_storage
+os.environ["SRP_MODEL_BACKEND"] = "stub"
+os.environ["SRP_DB_PATH"] = tempfile.mkdtemp(prefix="srp-test-db-")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+# Same as the scripts at the project root: make `app` importable without installing it
+sys.path.append(str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,153 @@
+# tests/test_compact_vector_store.py
+import numpy as np
+import pytest
+
+from app.db import compact_vector_store
+from app.db.compact_vector_store import CompactVectorStore
+
+DIM = 32
+SUBCATEGORIES = ["Laptops", "Televisions", "Shoes"]
+
+
+def make_products(n, seed=0, scale=1.0, prefix="P"):
+    rng = np.random.default_rng(seed)
+    ids = [f"{prefix}{i}" for i in range(n)]
+    vectors = (rng.standard_normal((n, DIM)) * scale).astype(np.float32)
+    metadatas = [{"subcategory": SUBCATEGORIES[i % len(SUBCATEGORIES)]} for i in range(n)]
+    return ids, [f"doc {pid}" for pid in ids], vectors, metadatas
+
+
+def brute_force(ids, vectors, query, n, mask=None):
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    candidates = np.arange(len(ids)) if mask is None else np.flatnonzero(mask)
+    best = candidates[np.argsort(distances[candidates])[:n]]
+    return [ids[i] for i in best], distances[best]
+
+
+def assert_matches_brute_force(store, ids, vectors, queries, n=10, where=None, mask=None):
+    for query in queries:
+        result = store.query(query, n_results=n, where=where)
+        expected_ids, expected_distances = brute_force(ids, vectors, query, n, mask)
+        assert result["ids"][0] == expected_ids
+        np.testing.assert_allclose(result["distances"][0], expected_distances, rtol=1e-4)
+
+
+@pytest.fixture(params=["int8", "float16"])
+def dtype(request):
+    return request.param
+
+
+def test_top_k_matches_brute_force(tmp_path, dtype):
+    ids, docs, vectors, metadatas = make_products(600)
+    store = CompactVectorStore(tmp_path, dtype=dtype)
+    store.upsert(ids, docs, vectors, metadatas)
+    queries = np.random.default_rng(1).standard_normal((5, DIM)).astype(np.float32)
+    assert_matches_brute_force(store, ids, vectors, queries)
+
+    result = store.query(queries[0], n_results=3)
+    assert result["documents"][0] == [f"doc {pid}" for pid in result["ids"][0]]
+    assert all(m["subcategory"] in SUBCATEGORIES for m in result["metadatas"][0])
+
+
+def test_int8_requantizes_when_the_range_grows(tmp_path):
+    ids, docs, vectors, metadatas = make_products(300, seed=0)
+    store = CompactVectorStore(tmp_path, dtype="int8")
+    store.upsert(ids, docs, vectors, metadatas)
+    scales = store.scales.copy()
+    # Codes of the first batch are only right under the new scales if they were requantized
+    more_ids, more_docs, more_vectors, more_metadatas = make_products(300, seed=1, scale=3.0, prefix="Q")
+    store.upsert(more_ids, more_docs, more_vectors, more_metadatas)
+    assert np.all(store.scales > scales)
+
+    all_ids, all_vectors = ids + more_ids, np.concatenate([vectors, more_vectors])
+    queries = np.concatenate([vectors[:3], more_vectors[:3]]) + 0.01
+    assert_matches_brute_force(store, all_ids, all_vectors, queries)
+
+
+def test_subcategory_filter(tmp_path, dtype):
+    ids, docs, vectors, metadatas = make_products(600)
+    store = CompactVectorStore(tmp_path, dtype=dtype)
+    store.upsert(ids, docs, vectors, metadatas)
+    queries = np.random.default_rng(2).standard_normal((3, DIM)).astype(np.float32)
+    mask = np.array([m["subcategory"] == "Shoes" for m in metadatas])
+    assert_matches_brute_force(store, ids, vectors, queries, where={"subcategory": {"$eq": "Shoes"}}, mask=mask)
+
+    result = store.query(queries[0], n_results=50, where={"subcategory": {"$eq": "Shoes"}})
+    assert {m["subcategory"] for m in result["metadatas"][0]} == {"Shoes"}
+    assert store.query(queries[0], where={"subcategory": {"$eq": "Nothing"}})["ids"] == [[]]
+    with pytest.raises(ValueError):
+        store.query(queries[0], where={"brand": {"$eq": "Acme"}})
+
+
+def test_upsert_overwrites_existing_ids(tmp_path, dtype):
+    ids, docs, vectors, metadatas = make_products(100)
+    store = CompactVectorStore(tmp_path, dtype=dtype)
+    store.upsert(ids, docs, vectors, metadatas)
+
+    new_vector = np.full((1, DIM), 5.0, dtype=np.float32)
+    store.upsert(["P7"], ["doc P7 v2"], new_vector, [{"subcategory": "Televisions"}])
+    assert store.count == 100
+
+    result = store.query(new_vector[0], n_results=1)
+    assert result["ids"] == [["P7"]]
+    assert result["documents"] == [["doc P7 v2"]]
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
+    # It moved subcategory, so the filters follow it
+    televisions = store.query(new_vector[0], n_results=1, where={"subcategory": {"$eq": "Televisions"}})
+    assert televisions["ids"] == [["P7"]]
+    laptops = store.query(new_vector[0], n_results=100, where={"subcategory": {"$eq": "Laptops"}})
+    assert "P7" not in laptops["ids"][0]
+
+
+def test_state_survives_reopening(tmp_path, dtype):
+    ids, docs, vectors, metadatas = make_products(300)
+    store = CompactVectorStore(tmp_path, dtype=dtype)
+    store.upsert(ids, docs, vectors, metadatas)
+    queries = vectors[:3] + 0.05
+
+    reopened = CompactVectorStore(tmp_path, dtype=dtype)
+    assert reopened.count == 300
+    assert_matches_brute_force(reopened, ids, vectors, queries)
+    assert reopened.query(queries[0], n_results=1)["documents"] == [["doc P0"]]
+
+    other_dtype = "float16" if dtype == "int8" else "int8"
+    with pytest.raises(ValueError):
+        CompactVectorStore(tmp_path, dtype=other_dtype)
+
+
+def test_open_store_catches_up_with_another_writer(tmp_path, dtype):
+    ids, docs, vectors, metadatas = make_products(200)
+    reader = CompactVectorStore(tmp_path, dtype=dtype)
+    writer = CompactVectorStore(tmp_path, dtype=dtype)
+    writer.upsert(ids[:100], docs[:100], vectors[:100], metadatas[:100])
+    assert reader.query(vectors[5], n_results=1)["ids"] == [["P5"]]
+
+    # Both write; rows are assigned from the on-disk state, so neither overwrites the other
+    reader.upsert(ids[100:150], docs[100:150], vectors[100:150], metadatas[100:150])
+    writer.upsert(ids[150:], docs[150:], vectors[150:], metadatas[150:])
+    assert_matches_brute_force(reader, ids, vectors, vectors[::40] + 0.01)
+    assert_matches_brute_force(writer, ids, vectors, vectors[::40] + 0.01)
+
+
+def test_results_survive_row_log_compaction(tmp_path, dtype, monkeypatch):
+    monkeypatch.setattr(compact_vector_store, "INITIAL_CAPACITY", 64)
+    ids, docs, vectors, metadatas = make_products(100)
+    store = CompactVectorStore(tmp_path, dtype=dtype)
+    other = CompactVectorStore(tmp_path, dtype=dtype)
+    store.upsert(ids, docs, vectors, metadatas)
+
+    # Every rewrite of the same products appends records; past the ratio the log is rewritten
+    rewrites = compact_vector_store.ROW_LOG_COMPACTION_RATIO + 1
+    for version in range(rewrites):
+        store.upsert(ids, [f"{d} v{version}" for d in docs], vectors, metadatas)
+    assert not (tmp_path / "rows.jsonl").exists()
+    assert (tmp_path / "rows.1.jsonl").exists()
+    with open(tmp_path / "rows.1.jsonl") as f:
+        assert sum(1 for _ in f) <= compact_vector_store.ROW_LOG_COMPACTION_RATIO * 100
+
+    queries = vectors[:3] + 0.01
+    last = f"v{rewrites - 1}"
+    for s in (store, other, CompactVectorStore(tmp_path, dtype=dtype)):
+        assert_matches_brute_force(s, ids, vectors, queries)
+        assert s.query(queries[0], n_results=1)["documents"] == [[f"doc P0 {last}"]]
+        assert s.count == 100
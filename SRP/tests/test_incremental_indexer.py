@@ -0,0 +1,152 @@
+# tests/test_incremental_indexer.py
+import os
+
+import pytest
+
+from scripts import incremental_indexer
+from scripts.incremental_indexer import ProductCsvFollower, complete_records_end, parse_records
+
+HEADER = b"pid,product_name,description\n"
+
+
+def row(i, description=None):
+    return f'P{i},Product {i},"{description or f"about {i}"}"\n'.encode()
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "products.csv"
+    path.write_bytes(HEADER)
+    return path
+
+
+def append(path, data: bytes):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def follower_for(path, from_beginning=True):
+    follower = ProductCsvFollower(path, path.parent / "state.json")
+    assert follower.start(from_beginning=from_beginning)
+    return follower
+
+
+def drain(follower, max_records=100):
+    """Reads and commits until there is nothing new; returns the PIDs read."""
+    pids = []
+    while True:
+        rows, end = follower.read_batch(max_records)
+        if not rows and end == follower.offset:
+            return pids
+        pids.extend(r["pid"] for r in rows)
+        follower.commit(end)
+
+
+# --- complete_records_end ---
+def test_complete_records_end_stops_at_last_newline_outside_quotes():
+    data = row(1) + b'P2,Product 2,"two\nlines"\n' + b'P3,Product 3,"still being wri'
+    end, n = complete_records_end(data, 10)
+    assert (end, n) == (len(row(1)) + len(b'P2,Product 2,"two\nlines"\n'), 2)
+
+
+def test_complete_records_end_keeps_parity_across_escaped_quotes():
+    data = b'P1,Product 1,"5"" screen, ""quoted"""\n' + b'P2,Product 2,"open\n'
+    end, n = complete_records_end(data, 10)
+    assert n == 1
+    assert data[:end].endswith(b'"""\n')
+
+
+def test_complete_records_end_honours_max_records():
+    data = row(1) + row(2) + row(3)
+    assert complete_records_end(data, 2) == (len(row(1)) + len(row(2)), 2)
+    assert complete_records_end(b"no newline yet", 5) == (0, 0)
+
+
+# --- parse_records ---
+def test_parse_records_maps_empty_cells_to_none_and_skips_malformed_rows():
+    data = b'P1,,"multi\nline"\n' + b"P2,too,many,columns\n" + b"\n" + row(3)
+    rows = parse_records(data, ["pid", "product_name", "description"])
+    assert rows == [
+        {"pid": "P1", "product_name": None, "description": "multi\nline"},
+        {"pid": "P3", "product_name": "Product 3", "description": "about 3"},
+    ]
+
+
+# --- ProductCsvFollower ---
+def test_follower_reads_appended_rows_and_waits_for_incomplete_ones(csv_path):
+    append(csv_path, row(1) + row(2))
+    follower = follower_for(csv_path)
+    assert drain(follower) == ["P1", "P2"]
+
+    append(csv_path, b'P3,Product 3,"half a ')
+    assert drain(follower) == []
+    append(csv_path, b'row"\n' + row(4))
+    assert drain(follower) == ["P3", "P4"]
+
+
+def test_follower_without_state_starts_at_the_end(csv_path, monkeypatch):
+    # A small read window makes the start-up scan work backwards through multi-line rows
+    monkeypatch.setattr(incremental_indexer, "READ_CHUNK_BYTES", 64)
+    append(csv_path, b"".join(row(i, f"line one\nline two of {i}") for i in range(20)))
+    append(csv_path, b'P99,Product 99,"unfinished\n')
+    follower = follower_for(csv_path, from_beginning=False)
+    assert follower.offset == os.path.getsize(csv_path) - len(b'P99,Product 99,"unfinished\n')
+
+    append(csv_path, b'row"\n' + row(100))
+    monkeypatch.setattr(incremental_indexer, "READ_CHUNK_BYTES", 4096)
+    assert drain(follower) == ["P99", "P100"]
+
+
+def test_follower_resumes_from_saved_state(csv_path):
+    append(csv_path, row(1))
+    first = follower_for(csv_path)
+    assert drain(first) == ["P1"]
+
+    append(csv_path, row(2))
+    resumed = follower_for(csv_path, from_beginning=True)
+    assert drain(resumed) == ["P2"]
+
+
+def test_follower_switches_to_rotated_and_truncated_files(csv_path):
+    append(csv_path, row(1) + row(2))
+    follower = follower_for(csv_path)
+    assert drain(follower) == ["P1", "P2"]
+
+    # Rotation: a new file takes the old one's name
+    rotated = csv_path.with_name("new.csv")
+    rotated.write_bytes(HEADER + row(3))
+    rotated.replace(csv_path)
+    assert not drain(follower)
+    assert follower.check_rotation()
+    assert drain(follower) == ["P3"]
+
+    # Truncation: the same file starts over
+    with open(csv_path, "wb") as f:
+        f.write(HEADER)
+    assert follower.check_rotation()
+    append(csv_path, row(4))
+    assert drain(follower) == ["P4"]
+
+
+def test_follower_skips_a_stray_quote_followed_by_complete_rows(csv_path):
+    append(csv_path, row(1))
+    follower = follower_for(csv_path)
+    assert drain(follower) == ["P1"]
+
+    append(csv_path, b'P2,TV 5" screen,bad\n' + row(3) + row(4))
+    assert drain(follower) == ["P3", "P4"]
+
+
+def test_follower_skips_a_stray_quote_once_the_file_stops_growing(csv_path, monkeypatch):
+    monkeypatch.setattr(incremental_indexer, "INCREMENTAL_STALLED_POLLS", 3)
+    follower = follower_for(csv_path)
+    append(csv_path, b'P1,TV 5" screen,bad\n')
+    for _ in range(2):
+        rows, end = follower.read_batch(10)
+        assert (rows, end) == ([], follower.offset)
+    rows, end = follower.read_batch(10)
+    assert rows == [] and end == os.path.getsize(csv_path)
+    follower.commit(end)
+
+    append(csv_path, row(2))
+    assert drain(follower) == ["P2"]
@@ -0,0 +1,90 @@
+# tests/test_inference_pool.py
+import asyncio
+import os
+import signal
+import time
+
+import pytest
+
+from app.services import inference_pool
+from app.services.inference_executor import ExecutorSaturatedError
+from app.services.inference_pool import InferenceWorkerPool, RequestTooLargeError
+
+PAIRS = [["laptop", f"product {i}"] for i in range(10)]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(inference_pool, "WORKER_RESPAWN_DELAY_SECONDS", 0.1)
+    # Stub models (see conftest.py), so workers start in well under a second
+    pool = InferenceWorkerPool(num_workers=2, max_queue_depth=4, max_pairs_per_job=4, threads_per_worker=1)
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+
+def predict(pool, pairs):
+    return asyncio.run(pool.predict(pairs))
+
+
+def wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_scores_are_split_across_workers_and_kept_in_order(pool):
+    scores, seconds = predict(pool, PAIRS)
+    assert len(scores) == len(PAIRS)
+    assert seconds >= 0
+    # Same pairs scored one chunk at a time give the same scores
+    for i in range(0, len(PAIRS), 4):
+        chunk_scores, _ = predict(pool, PAIRS[i:i + 4])
+        assert list(chunk_scores) == list(scores[i:i + 4])
+    assert pool.depth == 0
+
+
+def test_request_larger_than_the_pool_is_rejected_not_shed(pool):
+    assert pool.max_pairs_per_request == 16
+    with pytest.raises(RequestTooLargeError):
+        predict(pool, [["q", "d"]] * 17)
+    assert pool.shed_count == 0
+    assert len(predict(pool, [["q", "d"]] * 16)[0]) == 16
+
+
+def test_request_is_shed_when_slots_are_taken(pool):
+    async def run():
+        first = asyncio.ensure_future(pool.predict([["q", "d"]] * 12))
+        await asyncio.sleep(0)  # `first` reserves its 3 slots before awaiting
+        with pytest.raises(ExecutorSaturatedError):
+            await pool.predict([["q", "d"]] * 8)
+        await first
+    asyncio.run(run())
+    assert pool.shed_count == 1
+
+
+def test_crashed_worker_is_respawned(pool):
+    victim = pool.workers[0].process
+    os.kill(victim.pid, signal.SIGKILL)
+    wait_for(lambda: pool.workers_alive == 1)
+    # The surviving worker keeps serving requests that fit in its slots
+    assert len(predict(pool, PAIRS[:4])[0]) == 4
+
+    wait_for(lambda: pool.workers_alive == 2)
+    assert pool.worker_restarts == 1
+    assert pool.workers[0].process.pid != victim.pid
+    assert len(predict(pool, PAIRS)[0]) == len(PAIRS)
+
+
+def test_shutdown_stops_workers_and_releases_shared_memory(monkeypatch):
+    monkeypatch.setattr(inference_pool, "WORKER_RESPAWN_DELAY_SECONDS", 0.1)
+    pool = InferenceWorkerPool(num_workers=2, max_queue_depth=2, max_pairs_per_job=4, threads_per_worker=1)
+    pool.start()
+    processes = [w.process for w in pool.workers]
+    pool.shutdown()
+    assert not any(p.is_alive() for p in processes)
+    assert all(w.shm is None for w in pool.workers)
+    time.sleep(0.3)  # Past the respawn delay: a stopped pool must not bring workers back
+    assert pool.workers_alive == 0 and pool.worker_restarts == 0
+    pool.shutdown()  # Idempotent
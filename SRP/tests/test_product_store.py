@@ -0,0 +1,67 @@
+# tests/test_product_store.py
+import threading
+import time
+
+from app.db import product_store
+from app.db.product_store import ColumnarProductStore
+
+FIELDS = ["product_name", "discounted_price"]
+TYPES = {"discounted_price": "float"}
+
+
+def build(path, n, name="Product"):
+    pids = [f"P{i}" for i in range(n)]
+    columns = {"product_name": [f"{name} {i}" for i in range(n)], "discounted_price": [100 + i for i in range(n)]}
+    return ColumnarProductStore.build(path, pids, columns, TYPES)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_lookups_upserts_and_typed_columns(tmp_path):
+    store = build(tmp_path, 3)
+    assert store.get_many(["P2", "missing", "P0"], FIELDS) == [
+        {"product_name": "Product 2", "discounted_price": 102.0}, None,
+        {"product_name": "Product 0", "discounted_price": 100.0},
+    ]
+    store.upsert([{"pid": "P1", "product_name": "Renamed", "discounted_price": "n/a"}, {"pid": "P9"}])
+    assert store.get_many(["P1", "P9"], FIELDS) == [
+        {"product_name": "Renamed", "discounted_price": "n/a"},
+        {"product_name": None, "discounted_price": None},
+    ]
+    reopened = ColumnarProductStore(tmp_path, FIELDS)
+    assert len(reopened) == 4
+    assert reopened.get_many(["P1"], ["product_name"]) == [{"product_name": "Renamed"}]
+
+
+def test_empty_store_is_created_with_the_given_schema(tmp_path):
+    store = ColumnarProductStore(tmp_path / "store", FIELDS, TYPES)
+    assert len(store) == 0 and store.fields == FIELDS
+    store.upsert([{"pid": "P1", "discounted_price": 5}])
+    assert store.get_many(["P1"], ["discounted_price"]) == [{"discounted_price": 5.0}]
+
+
+def test_rebuild_is_loaded_off_the_lookup_path(tmp_path, monkeypatch):
+    store = build(tmp_path, 3)
+    build(tmp_path, 5, name="Rebuilt")
+
+    # Hold up the open store's loading of the new version; lookups must keep being answered from the old one
+    release = threading.Event()
+    real_table = product_store._Table
+
+    def slow_table(*args, **kwargs):
+        release.wait(5)
+        return real_table(*args, **kwargs)
+
+    monkeypatch.setattr(product_store, "_Table", slow_table)
+    started = time.monotonic()
+    assert store.get_many(["P0", "P4"], ["product_name"]) == [{"product_name": "Product 0"}, None]
+    assert time.monotonic() - started < 1.0
+
+    release.set()
+    wait_for(lambda: store.get_many(["P4"], ["product_name"]) == [{"product_name": "Rebuilt 4"}])
+    assert len(store) == 5
@@ -0,0 +1,119 @@
+# tests/test_sharding.py
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services.sharding import ShardedRetriever, ShardsUnavailableError, shard_for_product
+
+URLS = ["http://shard-0", "http://shard-1", "http://shard-2"]
+
+# What each shard holds: category -> [(distance, pid)], already sorted as a shard returns them
+SHARD_DATA = {
+    "shard-0": {"Laptops": [(0.1, "L1"), (0.4, "L4")], "Shoes": [(0.3, "S3")]},
+    "shard-1": {"Laptops": [(0.2, "L2"), (0.5, "L5")], "Shoes": [(0.1, "S1"), (0.6, "S6")]},
+    "shard-2": {"Laptops": [(0.3, "L3")], "Shoes": [(0.2, "S2")]},
+}
+
+
+def shard_handler(request: httpx.Request, down=()):
+    """Answers /api/shard/retrieve like a shard would, from SHARD_DATA."""
+    host = request.url.host
+    if host in down:
+        return httpx.Response(503)
+    body = json.loads(request.content)
+    held = SHARD_DATA[host]
+    categories = body["categories"] or [None]
+    results = []
+    for category in categories:
+        rows = held.get(category, []) if category else sorted(r for rows in held.values() for r in rows)
+        rows = rows[:body["n_results"]]
+        results.append({
+            "category": category, "ids": [pid for _, pid in rows],
+            "documents": [f"doc {pid}" for _, pid in rows], "distances": [d for d, _ in rows],
+        })
+    return httpx.Response(200, json={"results": results})
+
+
+def make_retriever(partition="hash", timeout_ms=1000, down=(), slow=(), requests=None):
+    async def handler(request):
+        if requests is not None:
+            requests.append((request.url.host, json.loads(request.content)["categories"]))
+        if request.url.host in slow:
+            await asyncio.sleep(5)
+        return shard_handler(request, down=down)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return ShardedRetriever(URLS, partition, timeout_ms, client=client)
+
+
+def retrieve(retriever, categories, n_per_category=3, n_fallback=4):
+    return asyncio.run(retriever.retrieve([0.0, 1.0], categories, n_per_category, n_fallback))
+
+
+def by_first_id(results):
+    return {r["ids"][0][0]: r for r in results}
+
+
+def test_merge_keeps_global_top_n_per_category():
+    results, partial = retrieve(make_retriever(), ["Laptops", "Shoes"])
+    assert not partial
+    laptops, shoes = by_first_id(results)["L1"], by_first_id(results)["S1"]
+    assert laptops["ids"] == [["L1", "L2", "L3"]]
+    assert laptops["distances"] == [[0.1, 0.2, 0.3]]
+    assert laptops["documents"] == [["doc L1", "doc L2", "doc L3"]]
+    assert shoes["ids"] == [["S1", "S2", "S3"]]
+
+
+def test_unfiltered_search_merges_everything_into_one_set():
+    results, partial = retrieve(make_retriever(), None)
+    assert not partial
+    assert [r["ids"] for r in results] == [[["L1", "S1", "L2", "S2"]]]
+
+
+def test_failed_shard_makes_the_result_partial():
+    retriever = make_retriever(down={"shard-1"})
+    results, partial = retrieve(retriever, ["Laptops"])
+    assert partial
+    assert results[0]["ids"] == [["L1", "L3", "L4"]]
+    assert retriever.stats["shard_failures"] == 1
+    assert retriever.stats["partial_searches"] == 1
+
+
+def test_slow_shard_is_cut_off_at_the_timeout():
+    retriever = make_retriever(timeout_ms=100, slow={"shard-2"})
+    loop = asyncio.new_event_loop()
+    try:
+        started = loop.time()
+        results, partial = loop.run_until_complete(retriever.retrieve([0.0], ["Laptops"], 3, 4))
+        elapsed = loop.time() - started
+    finally:
+        loop.close()
+    assert partial
+    assert results[0]["ids"] == [["L1", "L2", "L4"]]
+    assert elapsed < 1.0
+
+
+def test_no_shard_answering_raises():
+    retriever = make_retriever(down={"shard-0", "shard-1", "shard-2"})
+    with pytest.raises(ShardsUnavailableError):
+        retrieve(retriever, ["Laptops"])
+
+
+def test_subcategory_partition_only_asks_owners():
+    requests = []
+    retriever = make_retriever(partition="subcategory", requests=requests)
+    targets = retriever._targets(["Laptops", "Shoes", "Televisions"])
+    for shard_id, categories in targets.items():
+        for category in categories:
+            assert shard_for_product("any-pid", category, len(URLS), "subcategory") == shard_id
+    assert sorted(c for cs in targets.values() for c in cs) == ["Laptops", "Shoes", "Televisions"]
+
+    retrieve(retriever, ["Laptops"])
+    assert requests == [(f"shard-{shard_for_product('', 'Laptops', len(URLS), 'subcategory')}", ["Laptops"])]
+
+
+def test_hash_partition_asks_every_shard():
+    retriever = make_retriever(partition="hash")
+    assert retriever._targets(["Laptops"]) == {0: ["Laptops"], 1: ["Laptops"], 2: ["Laptops"]}
+    assert retriever._targets(None) == {0: None, 1: None, 2: None}
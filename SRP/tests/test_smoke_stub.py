@@ -0,0 +1,126 @@
+# tests/test_smoke_stub.py
+"""
+End-to-end smoke test of the search API on the stub model backend.
+conftest.py points SRP_DB_PATH at a temporary directory, so the index starts empty.
+"""
+import math
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.api import routers
+from app.core.config import CATEGORY_COLLECTION_NAME
+
+SUBCATEGORIES = ["Laptops", "Televisions", "Shoes"]
+# Category search strings -> the subcategory the intent classifier should predict for them
+CATEGORY_STRINGS = {"laptop": "Laptops", "notebook": "Laptops", "tv": "Televisions",
+                    "television": "Televisions", "shoe": "Shoes", "sneaker": "Shoes"}
+N_PRODUCTS = 30
+
+
+@pytest.fixture(scope="module")
+def client():
+    # The warmer would search the popular-query list in the background and race the assertions
+    app.main.WARM_CACHE_ENABLED = False
+    service = routers.search_service
+    strings = list(CATEGORY_STRINGS)
+    routers.chroma_manager.add_items_to_collection(
+        CATEGORY_COLLECTION_NAME,
+        ids=[f"cat-{i}" for i in range(len(strings))],
+        documents=[CATEGORY_STRINGS[s] for s in strings],
+        embeddings=service.embed_model.encode(strings),
+    )
+    with TestClient(app.main.app) as test_client:
+        products = []
+        for i in range(N_PRODUCTS):
+            subcategory = SUBCATEGORIES[i % len(SUBCATEGORIES)]
+            products.append({
+                "id": f"P{i}",
+                "document": f"product {i} {subcategory}",
+                "metadata": {"subcategory": subcategory},
+                "attributes": {"product_name": f"Product {i}", "brand": "Acme", "discounted_price": 100 + i},
+            })
+        response = test_client.post("/api/products", json=products)
+        assert response.status_code == 201, response.text
+        yield test_client
+
+
+def test_search_hydrates_requested_fields(client):
+    response = client.post("/api/search", json={"query": "laptop", "fields": ["product_name", "discounted_price"]})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["ranked_ids"]
+    assert not body["degraded"]
+    assert len(body["results"]) == len(body["ranked_ids"])
+    first = body["results"][0]
+    pid = int(body["ranked_ids"][0][1:])
+    assert first["product_name"] == f"Product {pid}"
+    # Typed column: prices come back as numbers, not strings
+    assert first["discounted_price"] == 100 + pid
+
+
+def test_search_rejects_unknown_fields(client):
+    response = client.post("/api/search", json={"query": "laptop", "fields": ["no_such_field"]})
+    assert response.status_code == 400
+
+
+def test_batch_matches_single_searches(client):
+    queries = ["laptop", "television", "sneaker"]
+    response = client.post("/api/search/batch", json={"queries": queries})
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert len(results) == len(queries)
+    for query, result in zip(queries, results):
+        single = client.post("/api/search", json={"query": query}).json()
+        assert result["ranked_ids"] == single["ranked_ids"]
+
+
+def test_cursor_pages_through_one_ranking(client):
+    full = client.post("/api/search", json={"query": "notebook"}).json()["ranked_ids"]
+    first = client.post("/api/search", json={"query": "notebook", "limit": 3}).json()
+    assert first["ranked_ids"] == full[:3]
+    assert first["total"] == len(full)
+    assert first["next_cursor"]
+
+    second = client.post("/api/search", json={"query": "notebook", "cursor": first["next_cursor"]}).json()
+    assert second["ranked_ids"] == full[3:6]
+
+    # A cursor is only valid for the query that started its session
+    mismatched = client.post("/api/search", json={"query": "tv", "cursor": first["next_cursor"]})
+    assert mismatched.status_code == 400
+    malformed = client.post("/api/search", json={"query": "notebook", "cursor": "not-a-cursor"})
+    assert malformed.status_code == 400
+
+
+def test_rerank_is_skipped_when_it_would_miss_the_deadline(client, monkeypatch):
+    service = routers.search_service
+    monkeypatch.setattr(service, "_estimate_rerank_seconds", lambda n_pairs: math.inf)
+    degraded_before = service.get_stats()["degraded"]
+
+    # A query no other test ran, so the answer can't come from the result cache
+    response = client.post("/api/search", json={"query": "shoe", "include_scores": True})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["degraded"]
+    assert body["ranked_ids"]
+    assert client.get("/api/search/stats").json()["degraded"] == degraded_before + 1
+
+    # Degraded results aren't cached: the next search reranks again
+    monkeypatch.undo()
+    assert not client.post("/api/search", json={"query": "shoe"}).json()["degraded"]
+
+
+def test_single_page_ranking_keeps_no_session(client):
+    sessions = routers.search_service.ranking_sessions
+    before = sessions.stats()["sessions"]
+    body = client.post("/api/search", json={"query": "sneaker", "limit": 100}).json()
+    assert body["total"] == len(body["ranked_ids"])
+    assert body["next_cursor"] is None
+    assert sessions.stats()["sessions"] == before
+
+
+def test_offset_without_limit_is_rejected(client):
+    response = client.post("/api/search", json={"query": "laptop", "offset": 5})
+    assert response.status_code == 400
+    assert client.post("/api/search", json={"query": "laptop", "offset": 0}).status_code == 200
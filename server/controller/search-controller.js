@@ -56,6 +56,12 @@ export const personalizedSearch = async (req, res) => {
 
     } catch (error) {
         console.error('Error in personalizedSearch calling SRP service:', error.response ? error.response.data : error.message);
+        // SRP sheds load with a 503 + Retry-After; pass that through so clients back off
+        if (error.response && error.response.status === 503) {
+            const retryAfter = error.response.headers['retry-after'];
+            if (retryAfter) res.set('Retry-After', retryAfter);
+            return res.status(503).json({ error: 'Search is busy, please retry shortly.' });
+        }
         // Implement a fallback to your old search logic if you want
         // For now, we just return an error
         res.status(500).json({ error: 'Failed to retrieve search results.' });